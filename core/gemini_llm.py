@@ -1,20 +1,53 @@
-import google.generativeai as genai
+import os
+import functools
+from typing import Optional
+
 from langchain.llms.base import LLM
 
+MODEL_NAME = "gemini-2.0-flash"
+
+
+@functools.lru_cache(maxsize=1)
+def _configure():
+    """
+    Imports and configures the Gemini client exactly once, on first use, and
+    returns the module. google.generativeai (gRPC + protobuf) is not loaded at
+    app startup.
+    """
+    import google.generativeai as genai
+
+    genai.configure(api_key=os.getenv("API_KEY"))
+    return genai
+
+
+@functools.lru_cache(maxsize=8)
+def _get_model(system_instruction: Optional[str] = None) -> "genai.GenerativeModel":
+    """
+    Shared GenerativeModel per system instruction, so client setup is not repeated
+    on every call and the fixed instruction travels as `system_instruction`
+    rather than being re-sent inside every prompt.
+    """
+    genai = _configure()
+    return genai.GenerativeModel(MODEL_NAME, system_instruction=system_instruction)
+
+
 class GeminiLLM(LLM):
     """Custom LangChain wrapper for the Gemini API."""
-    
 
-    def _call(self, prompt: str, stop=None) -> str:
+
+    def _call(self, prompt: str, stop=None, system_instruction: Optional[str] = None, **kwargs) -> str:
         """Call the Gemini 2.0 Flash model."""
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        response = model.generate_content(prompt)
+        return _get_model(system_instruction).generate_content(prompt).text
+
+    async def _acall(self, prompt: str, stop=None, system_instruction: Optional[str] = None, **kwargs) -> str:
+        """Async call to the Gemini 2.0 Flash model."""
+        response = await _get_model(system_instruction).generate_content_async(prompt)
         return response.text
 
     @property
     def _identifying_params(self):
-        return {"model_name": "gemini-2.0-flash"}
+        return {"model_name": MODEL_NAME}
 
     @property
     def _llm_type(self):
-        return "gemini"
\ No newline at end of file
+        return "gemini"
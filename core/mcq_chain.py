@@ -1,10 +1,16 @@
 # core/mcq_chain.py
 
-import json
+import os
+import re
+import asyncio
+import functools
 import logging
-from typing import List, Dict
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Optional
+
+import orjson
+import msgspec
 from langchain.prompts import (
-    ChatPromptTemplate,
     SystemMessagePromptTemplate,
     HumanMessagePromptTemplate
 )
@@ -17,15 +23,16 @@ COURSE_OUTCOMES: Dict[str, str] = {
 }
 
 def format_co_definitions(co_dict: Dict[str, str]) -> str:
-    formatted = "\n"
-    for tag, definition in co_dict.items():
-        formatted += f"- {tag}: {definition}\n"
-    return formatted.strip()
+    return "\n".join(f"- {tag}: {definition}" for tag, definition in co_dict.items())
+
+# Prompts are laid out static-first: everything that never changes comes
+# before the study material, and everything per-request comes after it, so
+# Gemini's prefix caching can reuse the longest possible shared prefix.
 
 # ✅ ESCAPED CURLY BRACES in JSON example
 SYSTEM_BASE_TEMPLATE = """
 You are an expert exam question creator.
-Your task is to generate exactly {num_questions} multiple-choice questions (MCQs)
+Your task is to generate multiple-choice questions (MCQs)
 strictly based on the provided study material and topics.
 
 Rules:
@@ -33,13 +40,7 @@ Rules:
 - Exactly 4 answer options per question.
 - Only one correct answer which MUST match one of the options.
 - No invented facts; questions must be based only on given context.
-
-CO TAGGING RULES:
-- Each question MUST include a 'co_tag'
-- Allowed tags: {co_tags}
-- Use the definitions below:
-
-{co_definitions}
+- Each question MUST include a 'co_tag' chosen from the allowed tags given with the request.
 
 --- OUTPUT FORMAT ---
 Return ONLY valid JSON. No markdown, no code fences, no explanations.
@@ -58,71 +59,200 @@ Output format:
 }}
 """
 
-USER_BASE_TEMPLATE = """
-Topics to Cover: {topics}
-Number of Questions: {num_questions}
-
+STUDY_MATERIAL_TEMPLATE = """
 Study Material:
 {context}
 """
 
+REQUEST_TEMPLATE = """
+CO TAGGING RULES:
+- Allowed tags: {co_tags}
+- Use the definitions below:
+
+{co_definitions}
+
+Topics to Cover: {topics}
+Number of Questions: {num_questions}
+Generate exactly {num_questions} questions.
+"""
+
+USER_BASE_TEMPLATE = STUDY_MATERIAL_TEMPLATE + REQUEST_TEMPLATE
+
+class MCQ(msgspec.Struct):
+    """One generated question, as described in the OUTPUT FORMAT block."""
+    question: str
+    options: List[str]
+    correct_answer: str
+    co_tag: str = "UNKNOWN"
+
+class MCQResponse(msgspec.Struct):
+    questions: List[MCQ] = []
+
+# Schema-specialized decoder, built once; validates while it parses
+MCQ_DECODER = msgspec.json.Decoder(MCQResponse)
+
+# Optional leading ```/```json fence and optional trailing ``` fence
+JSON_FENCE_RE = re.compile(r"^\s*(?:```(?:json)?)?\s*(.*?)\s*(?:```)?\s*$", re.DOTALL)
+
+# Compiled once at import; only the user turn is formatted per request
+SYSTEM_PROMPT = SystemMessagePromptTemplate.from_template(SYSTEM_BASE_TEMPLATE)
+USER_PROMPT = HumanMessagePromptTemplate.from_template(USER_BASE_TEMPLATE)
+
+# The system prompt has no variables, so it is rendered exactly once and sent
+# as Gemini's system_instruction instead of being repeated in every prompt
+SYSTEM_INSTRUCTION = SYSTEM_PROMPT.format().content
+
+@functools.lru_cache(maxsize=64)
+def co_definitions_for(co_tags: Tuple[str, ...]) -> str:
+    """Memoized CO definition block for a given combination of CO tags."""
+    filtered_cos = {tag: COURSE_OUTCOMES[tag] for tag in co_tags if tag in COURSE_OUTCOMES}
+    return format_co_definitions(filtered_cos)
+
+def partition_topics(topics: List[str], num_questions: int) -> List[Tuple[List[str], int]]:
+    """
+    Splits the topics into at most `num_questions` groups and spreads the
+    question count across them, so each group can be generated by its own LLM call.
+    """
+    if not topics or num_questions <= 0:
+        return []
+
+    groups = min(len(topics), num_questions)
+    buckets = [topics[i::groups] for i in range(groups)]
+    base, extra = divmod(num_questions, groups)
+    return [(bucket, base + (1 if i < extra else 0)) for i, bucket in enumerate(buckets)]
+
+
+# Full generation results, keyed on the normalized request (see mcq_cache_key)
+MCQ_RESULT_CACHE_SIZE = 256
+_mcq_results: "OrderedDict[tuple, Dict]" = OrderedDict()
+
+def mcq_cache_key(file_hash: str, topics: List[str], co_tags: List[str], num_questions: int) -> tuple:
+    """Normalized key for a generation request: same document, topics, CO tags and count."""
+    return (file_hash, tuple(sorted(topics)), tuple(sorted(co_tags)), num_questions)
+
+def get_cached_mcqs(key: tuple) -> Optional[Dict]:
+    """Returns a previously generated result for `key`, or None."""
+    result = _mcq_results.get(key)
+    if result is not None:
+        _mcq_results.move_to_end(key)
+    return result
+
+def cache_mcqs(key: tuple, result: Dict) -> None:
+    """Stores a generated result, evicting the least recently used entry when full."""
+    _mcq_results[key] = result
+    _mcq_results.move_to_end(key)
+    while len(_mcq_results) > MCQ_RESULT_CACHE_SIZE:
+        _mcq_results.popitem(last=False)
+
+
+# Upper bound on Gemini calls in flight across all requests, to stay under API rate limits
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "8"))
+_llm_semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+
+async def _bounded(call):
+    async with _llm_semaphore:
+        return await call
+
+def group_context(group: List[str], topic_chunks: Optional[Dict[str, List[str]]]) -> str:
+    """Study material for one topic group: its topics' chunks, each chunk once, in topic order."""
+    if not topic_chunks:
+        return ""
+    chunks = dict.fromkeys(chunk for topic in group for chunk in topic_chunks.get(topic, ()))
+    return "\n\n".join(chunks)
+
+
 class MCQGeneratorChain:
     def __init__(self):
         self.llm = GeminiLLM()
 
-    def run(self, topics: List[str], context: str, num_questions: int, co_tags: List[str]) -> List[Dict]:
+    def _render(self, topics: List[str], context: str, num_questions: int, co_tags: List[str]) -> Dict[str, str]:
+        """Renders the prompt pieces for a single LLM call."""
         if not co_tags:
             raise ValueError("CO tags cannot be empty.")
 
-        filtered_cos = {tag: COURSE_OUTCOMES[tag] for tag in co_tags if tag in COURSE_OUTCOMES}
-        co_defs = format_co_definitions(filtered_cos)
+        request_values = {
+            "co_tags": ", ".join(co_tags),
+            "co_definitions": co_definitions_for(tuple(co_tags)),
+            "topics": ", ".join(topics),
+            "num_questions": num_questions,
+        }
 
-        system_prompt = SystemMessagePromptTemplate.from_template(SYSTEM_BASE_TEMPLATE)
-        user_prompt = HumanMessagePromptTemplate.from_template(USER_BASE_TEMPLATE)
-        prompt = ChatPromptTemplate.from_messages([system_prompt, user_prompt])
+        return {
+            "system_instruction": SYSTEM_INSTRUCTION,
+            "prompt": USER_PROMPT.format(context=context, **request_values).content,
+        }
 
-        formatted_prompt = prompt.format_prompt(
-            co_tags=", ".join(co_tags),
-            co_definitions=co_defs,
-            topics=", ".join(topics),
-            context=context,
-            num_questions=num_questions
-        ).to_string()
+    def _parse(self, response) -> Dict:
+        """Turns the raw LLM output into the questions payload."""
+        # If Gemini returns a dict already, just return it
+        if isinstance(response, dict):
+            logging.error(f"RAW LLM OUTPUT:\n{orjson.dumps(response, option=orjson.OPT_INDENT_2).decode()}")
+            return response
 
-        try:
-            response = self.llm.invoke(formatted_prompt)
+        # Otherwise, treat as text
+        raw = response.strip()
 
-            # If Gemini returns a dict already, just return it
-            if isinstance(response, dict):
-                logging.error(f"RAW LLM OUTPUT:\n{json.dumps(response, indent=2)}")
-                return response
+        logging.error(f"RAW LLM OUTPUT:\n{raw}")
 
-            # Otherwise, treat as text
-            raw = response.strip()
+        # Remove ```json fences if present
+        clean = JSON_FENCE_RE.match(raw).group(1)
 
-            logging.error(f"RAW LLM OUTPUT:\n{raw}")
+        logging.error(f"CLEANED OUTPUT:\n{clean}")
 
-            clean = raw
+        return msgspec.to_builtins(MCQ_DECODER.decode(clean))
 
-            # Remove ```json fences if present
-            if clean.startswith("```json"):
-                clean = clean.removeprefix("```json").strip()
-            if clean.startswith("```"):
-                clean = clean.removeprefix("```").strip()
-            if clean.endswith("```"):
-                clean = clean.removesuffix("```").strip()
+    def run(self, topics: List[str], context: str, num_questions: int, co_tags: List[str]) -> Dict:
+        request = self._render(topics, context, num_questions, co_tags)
+
+        try:
+            response = self.llm.invoke(request["prompt"], system_instruction=request["system_instruction"])
 
-            logging.error(f"CLEANED OUTPUT:\n{clean}")
+            return self._parse(response)
+
+        except msgspec.DecodeError as e:
+            logging.error(f"JSON Decode Error: {e}")
+            raise RuntimeError("AI returned invalid JSON.")
+        except Exception as e:
+            logging.error(f"Chain Execution Error: {e}")
+            raise RuntimeError(f"Failed to generate MCQs: {e}")
+
+    async def arun(
+        self,
+        topics: List[str],
+        context: str,
+        num_questions: int,
+        co_tags: List[str],
+        topic_chunks: Optional[Dict[str, List[str]]] = None,
+    ) -> Dict:
+        """
+        Async variant of `run` that splits the topics into groups and generates
+        each group's questions with its own concurrent Gemini call.
+        With `topic_chunks` (retrieved chunks per topic), each call only gets its
+        own topics' chunks instead of the whole `context`.
+        """
+        requests = [
+            self._render(group, group_context(group, topic_chunks) or context, group_questions, co_tags)
+            for group, group_questions in partition_topics(topics, num_questions)
+        ]
+
+        try:
+            # Start every call before awaiting any of them; the semaphore caps how many run at once
+            calls = [self.llm._acall(**request) for request in requests]
+            responses = await asyncio.gather(*map(_bounded, calls))
 
-            return json.loads(clean)
-            
+            questions = []
+            for response in responses:
+                questions.extend(self._parse(response).get("questions", []))
+            return {"questions": questions}
 
-        except json.JSONDecodeError as e:
+        except msgspec.DecodeError as e:
             logging.error(f"JSON Decode Error: {e}")
             raise RuntimeError("AI returned invalid JSON.")
         except Exception as e:
             logging.error(f"Chain Execution Error: {e}")
             raise RuntimeError(f"Failed to generate MCQs: {e}")
 
+@functools.lru_cache(maxsize=1)
 def build_chain() -> MCQGeneratorChain:
+    """Process-wide chain; it holds no per-request state, so every request shares it."""
     return MCQGeneratorChain()
@@ -1,54 +1,360 @@
 import os
+import io
+import math
+import atexit
+import pickle
 import hashlib
-from langchain.document_loaders import PyPDFLoader
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import FAISS
+import threading
+import functools
+from collections import OrderedDict
+from itertools import islice, repeat
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
-def calculate_file_hash(file_path, block_size=65536):
+# torch, transformers, faiss and langchain are imported inside the functions that
+# use them, so importing this module (and starting the app) does not load ~1 GB
+# of ML libraries until the first upload or retrieval actually needs them.
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Opt-in CPU backend: EMBEDDING_BACKEND=onnx runs MiniLM through ONNX Runtime using
+# the int8 dynamically quantized export published in the model repo
+# (requires `optimum[onnxruntime]`). Unset keeps the torch backend.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+ONNX_MODEL_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+
+# HNSW graph parameters for newly built indexes; efSearch trades recall for query speed
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+
+# Above this many chunks, new indexes are IVF-PQ (compressed codes) instead of HNSW
+IVFPQ_MIN_VECTORS = int(os.getenv("FAISS_IVFPQ_MIN_VECTORS", "10000"))
+IVFPQ_M = 48  # sub-quantizers: 384 dims / 48 = 8 dims per 8-bit code
+IVFPQ_NBITS = 8
+IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+# Optional faiss.index_factory string (e.g. "Flat" or "OPQ48,IVF1024,PQ48x8") used for
+# every new index instead of the size-based choice above
+FAISS_INDEX_FACTORY = os.getenv("FAISS_INDEX_FACTORY")
+
+# Topic-query embeddings kept in memory (~1.5 KB each for 384 float32 dims)
+QUERY_EMBEDDING_CACHE_SIZE = 2048
+_query_embeddings: "OrderedDict[str, list]" = OrderedDict()
+_query_embeddings_lock = threading.Lock()
+
+# Opened vector stores, keyed on index path, so warm requests skip the disk load
+VECTOR_STORE_CACHE_SIZE = int(os.getenv("VECTOR_STORE_CACHE_SIZE", "32"))
+_vector_stores: "OrderedDict[str, object]" = OrderedDict()
+_vector_stores_lock = threading.Lock()
+
+# PDFs with at least this many pages have their text extracted by a process pool
+PARALLEL_EXTRACT_MIN_PAGES = int(os.getenv("PARALLEL_EXTRACT_MIN_PAGES", "64"))
+PAGES_PER_EXTRACT_WORKER = 16
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+# Chunks embedded and added to a new index per step while streaming a PDF in
+EMBED_BATCH_CHUNKS = 512
+
+# Below this many chunks, shipping work to the CPU process pool costs more than it saves
+MULTI_PROCESS_MIN_CHUNKS = 256
+
+def build_embeddings():
     """
-    Calculates the SHA256 hash of a file's content in chunks 
-    to handle large files efficiently.
+    MiniLM embeddings on the GPU when one is available, encoding chunks in large
+    batches with FP16 weights. On CPU the model stays FP32 (half precision is
+    slower there) and torch is allowed to use every core for the forward pass,
+    unless the quantized ONNX Runtime backend is enabled (EMBEDDING_BACKEND).
     """
-    hasher = hashlib.sha256()
-    try:
-        with open(file_path, 'rb') as f:
-            for block in iter(lambda: f.read(block_size), b''):
-                hasher.update(block)
-        return hasher.hexdigest()
-    except FileNotFoundError:
-        return None
-
-def load_and_chunk(file_path, chunk_size=500, overlap=90, document_id=None): # 👈 Accept the ID
-    """Loads a PDF and splits it into smaller documents, attaching a custom ID."""
-    loader = PyPDFLoader(file_path)
-    documents = loader.load()
-    
-    # 🟢 Inject the unique ID into the metadata of all initial documents
-    if document_id:
-        for doc in documents:
-            # Set the 'document_uuid' field in the LangChain Document metadata
-            doc.metadata['document_uuid'] = str(document_id) # 👈 Inject the UUID
+    import torch
+    from langchain.embeddings import HuggingFaceEmbeddings
+
+    if torch.cuda.is_available():
+        model_kwargs = {"device": "cuda", "model_kwargs": {"torch_dtype": torch.float16}}
+        batch_size = 128
+    elif EMBEDDING_BACKEND == "onnx":
+        # int8 VNNI/AVX2 dot products instead of FP32 matmuls on CPU
+        model_kwargs = {"device": "cpu", "backend": "onnx", "model_kwargs": {"file_name": ONNX_MODEL_FILE}}
+        batch_size = 64
+    else:
+        model_kwargs = {"device": "cpu"}
+        batch_size = 64
+        torch.set_num_threads(os.cpu_count())
+
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": batch_size, "normalize_embeddings": True},
+    )
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+def _get_embeddings():
+    """
+    Process-wide embeddings instance, so the model is loaded only once. The first
+    build is locked: a request arriving during the startup warm-up waits for that
+    load instead of starting a second copy of the model.
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                _embeddings = build_embeddings()
+    return _embeddings
+
+def warm_up():
+    """
+    Loads the embedding model and the (Rust-backed fast) tokenizer and runs one
+    encode, so the first upload or generation does not pay the cold start.
+    """
+    _get_tokenizer()
+    _get_embeddings().embed_query("warmup")
+
+@functools.lru_cache(maxsize=1)
+def _get_encode_pool():
+    """
+    Process pool with one MiniLM replica per CPU core, started on the first large
+    CPU index build and kept alive for the rest of the process.
+    """
+    model = _get_embeddings().client
+    pool = model.start_multi_process_pool()
+    atexit.register(model.stop_multi_process_pool, pool)
+    return pool
+
+def _embed_chunks(texts):
+    """
+    Embeds chunk texts for a new index in one batched encode call, returning a
+    float32 matrix that FAISS consumes directly (no per-row Python lists).
+    Large CPU builds are sharded across the process pool; GPU builds and small
+    documents use the in-process model.
+    """
+    import torch
+
+    embeddings = _get_embeddings()
+    use_pool = not torch.cuda.is_available() and len(texts) >= MULTI_PROCESS_MIN_CHUNKS
+
+    return embeddings.client.encode(
+        texts,
+        pool=_get_encode_pool() if use_pool else None,
+        batch_size=embeddings.encode_kwargs["batch_size"],
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+
+def _index_description(ntotal):
+    """
+    faiss.index_factory string for a new index of `ntotal` vectors: an HNSW graph
+    for ordinary documents, IVF-PQ (48 one-byte codes per vector instead of 384
+    floats) once the corpus is large enough to train it. FAISS_INDEX_FACTORY,
+    when set, overrides the choice.
+    """
+    if FAISS_INDEX_FACTORY:
+        return FAISS_INDEX_FACTORY
+    if ntotal > IVFPQ_MIN_VECTORS:
+        nlist = min(4096, 4 * int(math.sqrt(ntotal)))
+        return f"IVF{nlist},PQ{IVFPQ_M}x{IVFPQ_NBITS}"
+    return f"HNSW{HNSW_M}"
+
+def _optimize_index(flat_index):
+    """
+    Rebuilds the exact flat index LangChain produced as an ANN index (same L2
+    metric), so queries no longer scan every stored vector.
+    """
+    import faiss
+
+    vectors = flat_index.reconstruct_n(0, flat_index.ntotal)
+    index = faiss.index_factory(flat_index.d, _index_description(flat_index.ntotal), faiss.METRIC_L2)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+def _apply_search_params(db):
+    """Applies the configured efSearch / nprobe; indexes built before this stay flat."""
+    import faiss
+
+    # Unwrap a pre-transform (e.g. OPQ from FAISS_INDEX_FACTORY) to reach the HNSW / IVF index
+    index = db.index
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif hasattr(index, "nprobe"):
+        index.nprobe = IVF_NPROBE
+
+@functools.lru_cache(maxsize=1)
+def _get_tokenizer():
+    """The embedding model's own tokenizer, so chunk sizes are measured in model tokens."""
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+
+@functools.lru_cache(maxsize=8)
+def _get_splitter(chunk_size, overlap):
+    """
+    Token-aware recursive splitter, built once per (chunk_size, overlap). It splits
+    on paragraph, line and word boundaries with C-level regex/str operations
+    rather than a per-character Python loop.
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+        _get_tokenizer(), chunk_size=chunk_size, chunk_overlap=overlap,
+        separators=["\n\n", "\n", " ", ""],
+    )
+
+def new_file_hasher():
+    """
+    Hasher used for content-addressed cache keys (FAISS index dirs, Document.file_hash).
+    BLAKE2b is much faster than SHA-256 in software; a 32-byte digest keeps the
+    64-char hex keys the same width as before.
+    """
+    return hashlib.blake2b(digest_size=32)
+
+def _extract_page_range(data, start, stop):
+    """Extraction worker: texts of pages [start, stop) of the PDF in `data`."""
+    from pypdf import PdfReader
 
-    text_splitter = CharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap)
-    # The splitter will automatically carry over the custom 'document_uuid' to all final chunks
-    docs = text_splitter.split_documents(documents)
-    return docs
+    reader = PdfReader(io.BytesIO(data))
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+def _get_extract_pool():
+    """
+    Process pool for PDF text extraction, started on the first large PDF and kept
+    alive for the rest of the process, so later uploads skip interpreter start-up
+    and the pypdf import in every worker.
+    """
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            # spawn, not fork: this runs in a worker thread of a process with live torch threads
+            _extract_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            atexit.register(_extract_pool.shutdown)
+        return _extract_pool
+
+def _iter_page_texts(reader, data):
+    """
+    Page texts in page order. Large PDFs are split into one contiguous page range
+    per worker (pages are independent), so each worker gets one copy of the bytes
+    and parses it once; small ones, or any PDF on a single core, are extracted
+    in-process, where the pool would cost more than it saves.
+    """
+    total_pages = len(reader.pages)
+    workers = min(os.cpu_count() or 1, total_pages // PAGES_PER_EXTRACT_WORKER)
+    if total_pages < PARALLEL_EXTRACT_MIN_PAGES or workers < 2:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+        return
+
+    data = bytes(data)
+    bounds = [total_pages * i // workers for i in range(workers + 1)]
+    for texts in _get_extract_pool().map(_extract_page_range, repeat(data), bounds[:-1], bounds[1:]):
+        yield from texts
+
+def _iter_pages(source):
+    """
+    Yields one Document per PDF page. `source` is either a file path or the raw
+    PDF bytes; bytes are parsed from memory with pypdf, never written to disk.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        from pypdf import PdfReader
+        from langchain.schema import Document
+
+        reader = PdfReader(io.BytesIO(source))
+        total_pages = len(reader.pages)
+        for page_no, text in enumerate(_iter_page_texts(reader, source)):
+            yield Document(
+                page_content=text,
+                metadata={"page": page_no, "total_pages": total_pages},
+            )
+    else:
+        from langchain.document_loaders import PyPDFLoader
+
+        yield from PyPDFLoader(source).lazy_load()
+
+def iter_chunks(source, chunk_size=256, overlap=32, document_id=None): # 👈 Accept the ID
+    """
+    Streams a PDF (path or in-memory bytes) as chunks, one page at a time,
+    attaching a custom ID. chunk_size and overlap are in MiniLM tokens, so
+    every chunk fits the model input without truncation.
+    """
+    text_splitter = _get_splitter(chunk_size, overlap)
+    doc_uuid = str(document_id) if document_id else None
+
+    # 🟢 Only the current page is held before it is split
+    for page in _iter_pages(source):
+        # Scanned or blank pages extract to whitespace; there is nothing to split or embed
+        if not page.page_content.strip():
+            continue
+        if doc_uuid:
+            # Set the 'document_uuid' field; the splitter carries it over to every chunk
+            page.metadata['document_uuid'] = doc_uuid # 👈 Inject the UUID
+        yield from text_splitter.split_documents([page])
+
+def _build_store(chunks):
+    """
+    Embeds and indexes chunks EMBED_BATCH_CHUNKS at a time, so a streamed PDF is
+    never fully materialized as a chunk list. Returns None if there were no chunks.
+    """
+    from langchain.vectorstores import FAISS
+
+    db = None
+    chunks = iter(chunks)
+    while batch := list(islice(chunks, EMBED_BATCH_CHUNKS)):
+        texts = [doc.page_content for doc in batch]
+        text_embeddings = zip(texts, _embed_chunks(texts))
+        metadatas = [doc.metadata for doc in batch]
+        if db is None:
+            db = FAISS.from_embeddings(text_embeddings, _get_embeddings(), metadatas=metadatas)
+        else:
+            db.add_embeddings(text_embeddings, metadatas=metadatas)
+    return db
+
+def _load_store(index_path, embeddings):
+    """
+    Opens a saved index with the FAISS vectors memory-mapped read-only, so the OS
+    pages in only what queries touch instead of reading the whole index into RAM.
+    The docstore pickle is the one FAISS.save_local wrote into our own cache dir.
+    """
+    import faiss
+    from langchain.vectorstores import FAISS
+
+    index = faiss.read_index(
+        os.path.join(index_path, "index.faiss"),
+        faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY,
+    )
+    with open(os.path.join(index_path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
 
 def get_or_create_vector_store(index_path, docs=None):
     """
     Loads an existing FAISS index from 'index_path' or creates a new one.
     
     index_path is now based on the file's hash, enabling content-based caching.
+    `docs` may be a list or a lazy iterator such as iter_chunks().
     """
+    index_path = str(index_path)
+    with _vector_stores_lock:
+        db = _vector_stores.get(index_path)
+        if db is not None:
+            _vector_stores.move_to_end(index_path)
+            return db, "FAISS INDEX SERVED from memory."
+
     # Use the same embedding model consistently
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    embeddings = _get_embeddings()
 
     if os.path.exists(index_path):
         status_message = "FAISS INDEX RELOADED from cache."
         print(f"🟢 CACHE HIT: Loading existing FAISS index from: {index_path}")
-        # The allow_dangerous_deserialization=True flag is necessary for loading FAISS indices
-        db = FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
+        db = _load_store(index_path, embeddings)
         
     else:
         if docs is None:
@@ -56,10 +362,110 @@ def get_or_create_vector_store(index_path, docs=None):
         status_message = "FAISS INDEX CREATED and saved to cache."
         print(f"🟡 CACHE MISS: Creating NEW FAISS index at: {index_path}")
         
-        db = FAISS.from_documents(docs, embeddings)
+        db = _build_store(docs)
+        if db is None:
+            raise ValueError("❌ No readable content to build FAISS index!")
+        db.index = _optimize_index(db.index)
         
         # Save the new index for future use
         db.save_local(index_path) 
 
-    # Return a retriever object for the chain
-    return db.as_retriever(), status_message 
\ No newline at end of file
+    _apply_search_params(db)
+
+    with _vector_stores_lock:
+        _vector_stores[index_path] = db
+        _vector_stores.move_to_end(index_path)
+        while len(_vector_stores) > VECTOR_STORE_CACHE_SIZE:
+            _vector_stores.popitem(last=False)
+
+    # Return the vector store itself so callers can batch their queries (see search_topics)
+    return db, status_message
+
+def _readahead(path):
+    """Asks the kernel to start paging `path` in now (no-op where fadvise is unavailable)."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+def preload_vector_stores(cache_dir):
+    """
+    Opens the most recently built indexes under `cache_dir` (as many as the
+    in-memory LRU holds) and has the kernel read their memory-mapped vectors
+    ahead, so the first queries after a restart skip the cold load.
+    """
+    cache_dir = str(cache_dir)
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = [
+        entry for entry in os.scandir(cache_dir)
+        if os.path.exists(os.path.join(entry.path, "index.faiss"))
+    ]
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    entries = entries[:VECTOR_STORE_CACHE_SIZE]
+
+    # Oldest first, so the newest index ends up most recently used
+    for entry in reversed(entries):
+        index_path = os.path.join(cache_dir, entry.name)
+        try:
+            _readahead(os.path.join(index_path, "index.faiss"))
+            get_or_create_vector_store(index_path)
+        except Exception as e:
+            print(f"⚠️ Could not preload FAISS index {index_path}: {e}")
+    return len(entries)
+
+def embed_queries(topics):
+    """
+    Embeddings for topic queries, served from an LRU keyed on the normalized
+    topic (MiniLM's tokenizer is uncased, so lowercasing does not change the
+    vector). Only the misses are encoded, together in one batch.
+    """
+    keys = [topic.lower().strip() for topic in topics]
+
+    with _query_embeddings_lock:
+        found = {}
+        for key in keys:
+            if key in _query_embeddings:
+                _query_embeddings.move_to_end(key)
+                found[key] = _query_embeddings[key]
+
+    missing = [key for key in dict.fromkeys(keys) if key not in found]
+    if missing:
+        vectors = _get_embeddings().embed_documents(missing)
+        found.update(zip(missing, vectors))
+        with _query_embeddings_lock:
+            _query_embeddings.update(zip(missing, vectors))
+            while len(_query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                _query_embeddings.popitem(last=False)
+
+    return [found[key] for key in keys]
+
+def search_by_vectors(db, vectors, k=2):
+    """
+    Returns the top-k chunks for each query vector, in order. All vectors go to
+    FAISS as one (n, d) matrix in a single index.search call, and hits are mapped
+    back to Documents through the store's id mapping.
+    """
+    import numpy as np
+
+    if not vectors:
+        return []
+
+    _, ids = db.index.search(np.asarray(vectors, dtype="float32"), k)
+    return [
+        [db.docstore.search(db.index_to_docstore_id[i]) for i in row if i != -1]
+        for row in ids
+    ]
+
+def search_topics(db, topics, k=2):
+    """
+    Returns the top-k chunks for each topic, in topic order. Topic queries not
+    already cached are embedded in a single batched encode call
+    (sentence-transformers sorts a batch by length to minimize padding) and
+    then searched by vector.
+    """
+    return search_by_vectors(db, embed_queries(topics), k) 
\ No newline at end of file
@@ -0,0 +1,77 @@
+# core/query_batching.py
+
+import asyncio
+import logging
+from typing import List, Tuple
+
+from core.processing import embed_queries
+
+
+class BatchingEncoder:
+    """
+    Coalesces topic-embedding requests from concurrent /generate-question/ calls.
+    A background task waits up to `max_wait` seconds (or until `max_batch` topics
+    are queued) and embeds everything in one encode call, then hands each caller
+    its own vectors back through a Future.
+    """
+
+    def __init__(self, max_batch: int = 32, max_wait: float = 0.05):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "asyncio.Queue[Tuple[List[str], asyncio.Future]]" = None
+        self._worker: asyncio.Task = None
+
+    def _ensure_worker(self) -> None:
+        # Created lazily so the queue and task belong to the running event loop
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def embed(self, topics: List[str]) -> List[list]:
+        """Returns one embedding per topic, in order."""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((topics, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[List[str], asyncio.Future]]:
+        """Waits for one request, then gathers more until the batch is full or max_wait passes."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        queued = len(batch[0][0])
+        deadline = loop.time() + self.max_wait
+
+        while queued < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            queued += len(item[0])
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            texts = [topic for topics, _ in batch for topic in topics]
+            try:
+                vectors = await asyncio.to_thread(embed_queries, texts)
+            except Exception as e:
+                logging.error(f"Query embedding batch failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            start = 0
+            for topics, future in batch:
+                if not future.done():
+                    future.set_result(vectors[start:start + len(topics)])
+                start += len(topics)
+
+
+# Shared by all requests in this process
+query_encoder = BatchingEncoder()
@@ -22,12 +22,35 @@ def check_user_role(
     if current_role.lower() != required_role.lower():
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Access denied. Restricted to {required_role}.")
     
-    # 🌟 NEW: Look up the numerical ID using the validated username
-    user = db.query(User.id).filter(User.username == username).first()
+    # 🌟 Login stores the numerical ID in the session; only older sessions need the lookup
+    user_id = session.get("user_id")
+    if user_id is None:
+        user_id = db.query(User.id).filter(User.username == username).scalar()
 
-    if not user:
-        # Should not happen if login worked, but handle defensively
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Internal session error: User ID lookup failed.")
+        if user_id is None:
+            # Should not happen if login worked, but handle defensively
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Internal session error: User ID lookup failed.")
+
+        session["user_id"] = user_id
         
     # 🌟 Return the numerical ID (the true PK)
-    return user.id
\ No newline at end of file
+    return user_id
+
+
+def get_session_full_name(request: Request, db: Session):
+    """
+    Returns the logged-in user's full name from the session, which login fills in.
+    Older sessions fall back to one lookup whose result is stored back in the session.
+    Returns None if the session's user no longer exists.
+    """
+    session = request.session
+    full_name = session.get("full_name")
+    if full_name is not None and session.get("role"):
+        return full_name
+
+    row = db.query(User.full_name, User.role).filter(User.id == session.get("user_id")).first()
+    if row is None:
+        return None
+
+    session["full_name"], session["role"] = row.full_name, row.role
+    return row.full_name
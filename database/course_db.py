@@ -0,0 +1,52 @@
+import os
+import threading
+import logging
+from cachetools import TTLCache
+from sqlalchemy.orm import Session, joinedload, selectinload
+from database.models import Course
+from database.session import safe_query
+
+logger = logging.getLogger(__name__)
+
+# The course catalog only changes through the database, so every dashboard and
+# course page shares one snapshot for up to COURSE_CACHE_TTL seconds. There is no
+# invalidation hook: no endpoint writes courses or CILOs, so a change made directly
+# in the database (or by another worker process) stays invisible until the TTL
+# expires. Any endpoint that starts writing courses must clear _course_cache itself.
+COURSE_CACHE_TTL = int(os.getenv("COURSE_CACHE_TTL", "60"))
+_course_cache: TTLCache = TTLCache(maxsize=1, ttl=COURSE_CACHE_TTL)
+_course_cache_lock = threading.Lock()
+
+def _snapshot(course: Course) -> dict:
+    """Plain-data copy of a course with the fields the course templates read."""
+    return {
+        "id": course.id,
+        "code": course.code,
+        "title": course.title,
+        "instructor_id": course.instructor_id,
+        "instructor": {"full_name": course.instructor.full_name} if course.instructor else None,
+        "cilos": [
+            {"cilo_code": cilo.cilo_code, "description": cilo.description}
+            for cilo in course.cilos
+        ],
+    }
+
+def get_all_courses(db: Session) -> list:
+    """
+    All courses (with instructor name and CILOs) as read-only snapshots, served
+    from a short-lived in-process cache. Snapshots are plain dicts, so they are
+    safe to share across requests and sessions.
+    """
+    with _course_cache_lock:
+        courses = _course_cache.get("all")
+    if courses is not None:
+        return courses
+
+    # Instructor joined, CILOs selectin-loaded (two queries); any other lazy load raises
+    query = safe_query(Course, joinedload(Course.instructor), selectinload(Course.cilos))
+    courses = [_snapshot(course) for course in db.scalars(query).all()]
+    logger.debug(f"Loaded {len(courses)} courses into the course cache.")
+
+    with _course_cache_lock:
+        _course_cache["all"] = courses
+    return courses
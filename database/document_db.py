@@ -1,8 +1,23 @@
-from database.session import SessionLocal
+import uuid
+import threading
+from collections import OrderedDict
+from database.session import SessionLocal, safe_query
 import logging 
 from database.models import Document 
-import logging 
-from sqlalchemy import select
+
+logger = logging.getLogger(__name__)
+
+# Hashes known to be in the documents table, checked before any DB round-trip
+RECENT_HASHES_MAX = 10_000
+_recent_hashes: "OrderedDict[str, None]" = OrderedDict()
+_recent_hashes_lock = threading.Lock()
+
+def _remember_hash(file_hash: str) -> None:
+    with _recent_hashes_lock:
+        _recent_hashes[file_hash] = None
+        _recent_hashes.move_to_end(file_hash)
+        while len(_recent_hashes) > RECENT_HASHES_MAX:
+            _recent_hashes.popitem(last=False)
 
 def save_document(document_name: str, file_hash: str, index_path: str, document_uuid: str, user_id: int):
     """
@@ -13,13 +28,24 @@ def save_document(document_name: str, file_hash: str, index_path: str, document_
         file_hash: The cryptographic hash used for caching and retrieval
         index_path: The path to the created FAISS index on the server 
         document_uuid: The unique ID associated with the document.
+
+    Returns the new or existing Document, or None when the hash was found in the
+    in-process recent-hash cache (callers only rely on the call not raising).
     """
+    # Recently saved or seen in this process: skip the DB entirely
+    with _recent_hashes_lock:
+        if file_hash in _recent_hashes:
+            _recent_hashes.move_to_end(file_hash)
+            logger.debug(f"Metadata for hash {file_hash} already exists (recent). Skipping insert.")
+            return None
+
     session = SessionLocal()
     try:
         # Check if the hash already exists before insertion
         existing_doc = session.query(Document).filter(Document.file_hash == file_hash).first()
         if existing_doc:
-            logging.info(f"Metadata for hash {file_hash} already exists. Skipping insert.")
+            _remember_hash(file_hash)
+            logger.debug(f"Metadata for hash {file_hash} already exists. Skipping insert.")
             return existing_doc # Return the existing document
 
         # Create new document instance with all required fields
@@ -27,16 +53,17 @@ def save_document(document_name: str, file_hash: str, index_path: str, document_
             filename=document_name, 
             file_hash=file_hash,
             index_path=index_path,
-            document_uuid=document_uuid,
+            document_uuid=uuid.UUID(str(document_uuid)),
             uploaded_by_user_id=user_id
             )
         session.add(new_doc)
         session.commit()
-        logging.info(f"✅ DB SUCCESS: Saved metadata for: {document_name} with hash: {file_hash}")
+        _remember_hash(file_hash)
+        logger.debug(f"✅ DB SUCCESS: Saved metadata for: {document_name} with hash: {file_hash}")
         return new_doc
     except Exception as e:
         session.rollback()
-        logging.error(f"❌ DB FAILURE: Failed to save metadata for {document_name}. Error: {e}")
+        logger.error(f"❌ DB FAILURE: Failed to save metadata for {document_name}. Error: {e}")
         # Re-raise the exception for the calling FastAPI endpoint to handle
         raise 
     finally:
@@ -53,18 +80,19 @@ def retrieve_all_documents_metadata() -> list[dict]:
     session = SessionLocal()
     try:
         # Select all documents, ordered by creation date descending
+        # to_dict() only reads columns, so no relationship needs loading
         documents = session.execute(
-            select(Document)
+            safe_query(Document)
             .order_by(Document.created_at.desc())
         ).scalars().all()
 
         # Convert ORM objects to list of dictionaries using the to_dict method
         document_list = [doc.to_dict() for doc in documents]
         
-        logging.info(f"DB: Retrieved {len(document_list)} document records.")
+        logger.debug(f"DB: Retrieved {len(document_list)} document records.")
         return document_list
     except Exception as e:
-        logging.error(f"❌ DB FAILURE: Failed to retrieve document list. Error: {e}")
+        logger.error(f"❌ DB FAILURE: Failed to retrieve document list. Error: {e}")
         # Raise the exception for the calling FastAPI endpoint to handle
         raise 
     finally:
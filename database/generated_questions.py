@@ -1,7 +1,7 @@
-import json
-import uuid
+import orjson
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from database.models import GeneratedQuestion
+from database.models import GeneratedQuestion, uuid7
 
 def save_generated_questions(
     db: Session, 
@@ -16,30 +16,29 @@ def save_generated_questions(
     """
     
     new_questions = []
-    saved_count = 0
     
     for q_data in questions_list:
         # Skip incomplete data
         if not q_data.get("question") or not q_data.get("correct_answer"):
             continue 
 
-        new_q = GeneratedQuestion(
-            question_id=uuid.uuid4(),
-            pdf_hash_id=pdf_hash_id,
-            user_id=user_id,
-            question_text=q_data.get("question", ""),
-            options_json=json.dumps(q_data.get("options", [])), 
-            correct_answer=q_data.get("correct_answer", ""),
-            co_tag=q_data.get("co_tag", "UNKNOWN")
-        )
-        new_questions.append(new_q)
-        db.add(new_q)
-        saved_count += 1
+        new_questions.append({
+            "question_id": uuid7(),
+            "pdf_hash_id": pdf_hash_id,
+            "user_id": user_id,
+            "question_text": q_data.get("question", ""),
+            "options_json": orjson.dumps(q_data.get("options", [])).decode(), 
+            "correct_answer": q_data.get("correct_answer", ""),
+            "co_tag": q_data.get("co_tag", "UNKNOWN"),
+        })
+
+    saved_count = len(new_questions)
 
     try:
+        if new_questions:
+            # One executemany INSERT instead of a unit-of-work flush per object
+            db.execute(insert(GeneratedQuestion), new_questions)
         db.commit()
-        # Refresh is only needed if you plan to immediately use generated data with ORM
-        # db.refresh(new_questions[0]) 
         return saved_count, "success"
     except Exception as db_e:
         db.rollback()
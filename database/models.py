@@ -1,24 +1,64 @@
+import os
+import time
 import uuid
+import hashlib
+import threading
+from cachetools import TTLCache
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime, timezone
-from sqlalchemy import Integer, Column, String, DateTime, Text, ForeignKey, Float
+from sqlalchemy import Integer, Column, String, DateTime, Text, ForeignKey, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
 
 from passlib.context import CryptContext
 
-# Define the hashing context
-pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
+# Define the hashing context. New hashes use Argon2id (argon2-cffi's C core, OWASP
+# parameters); bcrypt and legacy sha256_crypt hashes still verify and are upgraded
+# on the user's next successful login.
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt", "sha256_crypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__time_cost=2,
+    argon2__memory_cost=19456,
+    argon2__parallelism=1,
+    bcrypt__rounds=12,
+)
+
+# Short-lived record of successful verifications, so a client repeating the same
+# credentials skips the KDF. Keys never hold the raw password, only a keyed
+# BLAKE2b digest of it under a per-process secret.
+_verified_passwords = TTLCache(maxsize=1024, ttl=300)
+_verified_passwords_lock = threading.Lock()
+_VERIFY_CACHE_PEPPER = os.urandom(32)
+
+def _verify_cache_key(password: str, hashed_password: str) -> tuple:
+    digest = hashlib.blake2b(password.encode("utf-8"), key=_VERIFY_CACHE_PEPPER, digest_size=16).hexdigest()
+    return (hashed_password, digest)
 
 Base = declarative_base()
 
+
+def uuid7() -> uuid.UUID:
+    """
+    Time-ordered UUID (RFC 9562 version 7): 48-bit Unix milliseconds followed by
+    random bits. New keys sort after existing ones, so primary-key inserts append
+    to the end of the B-tree instead of landing on random pages.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    value &= ~(0xF000 << 64)
+    value |= 0x7000 << 64  # version 7
+    value &= ~(0xC000 << 48)
+    value |= 0x8000 << 48  # RFC 4122 variant
+    return uuid.UUID(int=value)
+
 class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
     full_name = Column(String)
-    username = Column(String, unique=True, index=True)
+    username = Column(String, unique=True, index=True, nullable=False)
     # Store the hashed password
     hashed_password = Column(String) 
     role = Column(String) # e.g., "student", "faculty"
@@ -27,7 +67,7 @@ class User(Base):
     # Static method to get the hash of a password
     @staticmethod
     def get_password_hash(password):
-        """Hashes a password using the SHA256-based context."""
+        """Hashes a password using the context's default scheme (Argon2id)."""
         return pwd_context.hash(password)
 
     # Instance method to set the password
@@ -37,8 +77,30 @@ class User(Base):
 
     # Instance method to check a password
     def check_password(self, password):
-        """Verifies a password against the stored hash."""
-        return pwd_context.verify(password, self.hashed_password)
+        """
+        Verifies a password against the stored hash. If the hash uses a deprecated
+        scheme or outdated cost, it is replaced with a fresh one; the caller is
+        responsible for committing the change.
+        Successful checks are remembered for a few minutes (see _verified_passwords).
+        """
+        key = _verify_cache_key(password, self.hashed_password)
+        with _verified_passwords_lock:
+            if key in _verified_passwords:
+                return True
+
+        try:
+            valid, new_hash = pwd_context.verify_and_update(password, self.hashed_password)
+        except (ValueError, TypeError):
+            # Missing or malformed stored hash: reject rather than raise
+            return False
+
+        if valid:
+            if new_hash:
+                self.hashed_password = new_hash
+                key = _verify_cache_key(password, new_hash)
+            with _verified_passwords_lock:
+                _verified_passwords[key] = True
+        return valid
     
     # Relationship to courses (for faculty)
     courses = relationship("Course", back_populates="instructor")
@@ -67,22 +129,25 @@ class Course(Base):
     id = Column(Integer, primary_key=True)
     code = Column(String(50), nullable=False)
     title = Column(String(255), nullable=False)
-    instructor_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    # Indexed: every faculty page filters courses by instructor
+    instructor_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), index=True)
 
-     # Relationship to faculty
-    instructor = relationship("User", back_populates="courses")
+     # Relationship to faculty (many-to-one: one LEFT OUTER JOIN with the course row)
+    instructor = relationship("User", back_populates="courses", lazy="joined")
 
-    # Relationship to CILOs
-    cilos = relationship("CILO", back_populates="course", cascade="all, delete-orphan")
+    # Relationship to CILOs (every course card lists them; one IN query per course list)
+    cilos = relationship("CILO", back_populates="course", cascade="all, delete-orphan", lazy="selectin")
 
-    topics = relationship("Topic", back_populates="course", cascade="all, delete")
+    # Ordered, so pages can eager-load a course's topics in display order
+    topics = relationship("Topic", back_populates="course", cascade="all, delete", order_by="Topic.topic_no")
 
 
 class CILO(Base):
     __tablename__ = "cilos"
 
     id = Column(Integer, primary_key=True)
-    course_id = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), nullable=False)
+    # Indexed: Course.cilos is selectin-loaded with course_id IN (...)
+    course_id = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), nullable=False, index=True)
     cilo_code = Column(String, nullable=False)
     description = Column(Text, nullable=False)
 
@@ -94,15 +159,24 @@ class Topic(Base):
     Represents a learning material topic uploaded by faculty.
     """
     __tablename__ = "topics"
+    __table_args__ = (
+        # One topic per number, file and file content within a course; upload_topic
+        # relies on these instead of checking first. Each also serves as an index:
+        # (course_id, topic_no) covers topic lists, WHERE course_id = ? ORDER BY topic_no
+        UniqueConstraint("course_id", "topic_no", name="uq_topic_course_topicno"),
+        UniqueConstraint("course_id", "file_name", name="uq_topic_course_file_name"),
+        UniqueConstraint("course_id", "file_hash", name="uq_topic_course_hash"),
+    )
 
-  
     id = Column(Integer, primary_key=True, index=True)
     topic_no = Column(Integer, nullable=False, index=True) 
     title = Column(String(255), nullable=False)
     subtitle = Column(String(500), default="", nullable=True) 
 
     # File Data
-    file_path = Column(String(500), nullable=True) # Stores the path to the uploaded file
+    file_path = Column(String(500), nullable=True) # Stores the path to the uploaded file (named by content hash)
+    file_name = Column(String(255), nullable=True) # Original name of the uploaded file
+    file_hash = Column(String(64), nullable=True) # Content hash of the uploaded file, computed while it is saved
 
     # Relationships 
     course_id = Column(Integer, ForeignKey("courses.id"), nullable=False, index=True)
@@ -115,6 +189,11 @@ class Topic(Base):
 
     downloads = relationship("DownloadHistory", back_populates="topic", cascade="all, delete")
 
+    @property
+    def original_filename(self):
+        """Name the file was uploaded with; older rows stored it as the file name on disk."""
+        return self.file_name or os.path.basename(self.file_path or "")
+
     def __repr__(self):
         return f"<Topic(id={self.id}, title='{self.title}', topic_no={self.topic_no})>"
     
@@ -123,6 +202,12 @@ class Topic(Base):
 
 class DownloadHistory(Base):
     __tablename__ = "download_history"
+    __table_args__ = (
+        # One row per student and topic; the download upsert conflicts on it
+        UniqueConstraint("user_id", "topic_id", name="uq_download_history_user_topic"),
+        # A student's most recent downloads (courses page)
+        Index("ix_download_history_user_downloaded_at", "user_id", "downloaded_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -139,7 +224,8 @@ class DownloadHistory(Base):
 class Document(Base):
     __tablename__ = "documents"
     
-    document_uuid = Column(String, primary_key=True, unique=True, index=True, default=lambda: str(uuid.uuid4()))
+    # Native 16-byte uuid instead of 36-char text: smaller, faster primary-key index
+    document_uuid = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     filename = Column(String, nullable=False)
     file_hash = Column(String, unique=True, index=True, nullable=False)
     index_path = Column(String, nullable=False) 
@@ -171,7 +257,7 @@ class GeneratedQuestion(Base):
     __tablename__ = "generated_questions"
     
     # Primary Key
-    question_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    question_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     
     # Foreign Keys / Document Metadata
     pdf_hash_id = Column(String, ForeignKey("documents.file_hash")) # Link to the indexed document
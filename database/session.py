@@ -1,16 +1,15 @@
 import os
 import logging 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, select, inspect, UniqueConstraint
+from sqlalchemy.orm import sessionmaker, raiseload
 from database.models import Base
-import logging 
 
 
 load_dotenv()
 
-# Configure logging to ensure visibility of DB actions
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Handlers are configured once by the app (utils.logging_setup.configure_logging)
+logger = logging.getLogger(__name__)
 
 # PostgreSQL connection details from .env
 DB_USER = os.getenv("POSTGRES_USER")
@@ -21,20 +20,91 @@ DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 
 DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# Connection pool sizing; the defaults (5 + 10 overflow) stall under concurrent requests
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
 # Create the engine
-engine = create_engine(DATABASE_URL)
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=DB_POOL_RECYCLE,
+    # Batch executemany UPDATE/DELETE too, not just INSERT
+    executemany_mode="values_plus_batch",
+    insertmanyvalues_page_size=1000,
+    connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"},
+)
 
 # Create a configured "Session" class
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
+# DDL that brings a database created by an older version up to the current models
+UPGRADE_SQL = os.path.join(os.path.dirname(__file__), "upgrade_existing_db.sql")
+
+
+def missing_mapped_columns(bind) -> list:
+    """
+    Columns mapped on the models but absent from existing tables. create_all never
+    adds columns to a table that already exists, and every SELECT of the model
+    names all of its mapped columns, so one missing column breaks every query.
+    """
+    inspector = inspect(bind)
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        missing.extend(f"{table.name}.{c.name}" for c in table.columns if c.name not in existing)
+    return missing
+
+
+def missing_unique_constraints(bind) -> list:
+    """
+    Named unique constraints declared on the models but absent from the database.
+    create_all never alters existing tables, and some writes (topic uploads, the
+    download upsert) rely on these constraints instead of checking first.
+    """
+    inspector = inspect(bind)
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        declared = {c.name for c in table.constraints if isinstance(c, UniqueConstraint) and c.name}
+        if not declared or not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_unique_constraints(table.name)}
+        missing.extend(f"{table.name}.{name}" for name in sorted(declared - existing))
+    return missing
+
+
 def initialize_database():
-    """Creates database tables if they don't exist."""
-    logging.info("Initializing database tables...")
+    """
+    Creates database tables if they don't exist, then checks existing tables
+    against the models. Raises RuntimeError if a mapped column is missing.
+    """
+    logger.info("Initializing database tables...")
     try:
         Base.metadata.create_all(engine)
-        logging.info("Database initialization complete.")
+        missing_columns = missing_mapped_columns(engine)
+        missing_constraints = missing_unique_constraints(engine)
     except Exception as e:
-        logging.error(f"Failed to initialize database: {e}")
+        logger.error(f"Failed to initialize database: {e}")
+        return
+
+    # ❌ Every query on these tables would fail, so refuse to start
+    if missing_columns:
+        message = f"Database schema is out of date, missing columns: {', '.join(missing_columns)}. Apply {UPGRADE_SQL}"
+        logger.critical(message)
+        raise RuntimeError(message)
+
+    if missing_constraints:
+        logger.error(
+            f"Missing unique constraints, duplicates will not be rejected: {', '.join(missing_constraints)}. "
+            f"Apply {UPGRADE_SQL}"
+        )
+    logger.info("Database initialization complete.")
 
 
 def get_db():
@@ -43,3 +113,13 @@ def get_db():
         yield db          # let the calling code use it
     finally:
         db.close()         # automatically close it when done
+
+
+def safe_query(model, *loads):
+    """
+    SELECT for `model` that eagerly loads only the given relationship options
+    (e.g. selectinload(Document.uploader)) and raises on any other lazy load,
+    so a template or serializer that touches an unloaded relationship fails
+    loudly instead of quietly issuing one query per row.
+    """
+    return select(model).options(*loads, raiseload("*"))
@@ -0,0 +1,89 @@
+-- Brings a database created by an older version of the app up to the current models.
+-- create_all() only creates missing tables; it never alters existing ones, so every
+-- column, index and constraint added to an existing table since then is listed here.
+-- Run once with psql against the app database (autocommit, the default, is required
+-- for CREATE INDEX CONCURRENTLY):
+--   psql "$DATABASE_URL" -f database/upgrade_existing_db.sql
+-- Every step is safe to re-run. initialize_database() refuses to start while a mapped
+-- column is missing and logs any unique constraint that is still missing.
+
+
+-- users: username is the login key (unique index already exists)
+ALTER TABLE users ALTER COLUMN username SET NOT NULL;
+
+
+-- documents: native uuid primary key instead of 36-char text
+ALTER TABLE documents
+  ALTER COLUMN document_uuid TYPE uuid USING document_uuid::uuid;
+
+
+-- courses / cilos: foreign keys filtered by every faculty page and the CILO loads
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_courses_instructor_id ON courses (instructor_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_cilos_course_id ON cilos (course_id);
+
+
+-- topics: content hash and original file name (files are stored by hash)
+ALTER TABLE topics ADD COLUMN IF NOT EXISTS file_hash VARCHAR(64);
+ALTER TABLE topics ADD COLUMN IF NOT EXISTS file_name VARCHAR(255);
+
+-- Rows saved before file_name existed were stored under their original name
+UPDATE topics SET file_name = regexp_replace(file_path, '^.*/', '')
+ WHERE file_name IS NULL AND file_path IS NOT NULL;
+
+-- Keep the oldest topic of every duplicate group so the unique constraints can be added.
+-- Their download rows go first; their files stay on disk.
+CREATE TEMP TABLE duplicate_topics AS
+  SELECT id FROM (
+    SELECT id, file_name, file_hash,
+           row_number() OVER (PARTITION BY course_id, topic_no ORDER BY id) AS by_no,
+           row_number() OVER (PARTITION BY course_id, file_name ORDER BY id) AS by_name,
+           row_number() OVER (PARTITION BY course_id, file_hash ORDER BY id) AS by_hash
+    FROM topics
+  ) ranked
+  WHERE by_no > 1
+     OR (file_name IS NOT NULL AND by_name > 1)
+     OR (file_hash IS NOT NULL AND by_hash > 1);
+DELETE FROM download_history WHERE topic_id IN (SELECT id FROM duplicate_topics);
+DELETE FROM topics WHERE id IN (SELECT id FROM duplicate_topics);
+DROP TABLE duplicate_topics;
+
+-- Superseded by the unique constraints below
+DROP INDEX IF EXISTS ix_topic_course_topicno;
+DROP INDEX IF EXISTS ix_topic_course_file_path;
+DROP INDEX IF EXISTS ix_topic_course_hash;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_topic_course_topicno') THEN
+    ALTER TABLE topics ADD CONSTRAINT uq_topic_course_topicno UNIQUE (course_id, topic_no);
+  END IF;
+  IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_topic_course_file_name') THEN
+    ALTER TABLE topics ADD CONSTRAINT uq_topic_course_file_name UNIQUE (course_id, file_name);
+  END IF;
+  IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_topic_course_hash') THEN
+    ALTER TABLE topics ADD CONSTRAINT uq_topic_course_hash UNIQUE (course_id, file_hash);
+  END IF;
+END $$;
+
+
+-- download_history: one row per student and topic (the download upsert conflicts on it).
+-- Older check-then-insert code could leave duplicates; keep the most recent one.
+DELETE FROM download_history d
+ USING download_history newer
+ WHERE d.user_id = newer.user_id
+   AND d.topic_id = newer.topic_id
+   AND (COALESCE(d.downloaded_at, '-infinity'), d.id)
+     < (COALESCE(newer.downloaded_at, '-infinity'), newer.id);
+
+DROP INDEX IF EXISTS ix_download_history_user_topic;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_download_history_user_topic') THEN
+    ALTER TABLE download_history ADD CONSTRAINT uq_download_history_user_topic UNIQUE (user_id, topic_id);
+  END IF;
+END $$;
+
+-- A student's most recent downloads (courses page)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_download_history_user_downloaded_at
+  ON download_history (user_id, downloaded_at);
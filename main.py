@@ -1,29 +1,25 @@
 import os
-import tempfile
-import uuid
+import asyncio
 import logging
 from pathlib import Path
-import json
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.responses import JSONResponse, RedirectResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
 from dotenv import load_dotenv
-import google.generativeai as genai
 
 # --- Local Imports ---
-from core.processing import load_and_chunk, get_or_create_vector_store, calculate_file_hash
-from core.mcq_chain import build_chain
+from core.processing import iter_chunks, get_or_create_vector_store, search_by_vectors, new_file_hasher, warm_up, preload_vector_stores
+from core.query_batching import query_encoder
+from core.mcq_chain import build_chain, mcq_cache_key, get_cached_mcqs, cache_mcqs
 from database.session import initialize_database
 from database.check_user_role import Depends, check_user_role
 from database.document_db import save_document, retrieve_all_documents_metadata
-from database.generated_questions import save_generated_questions
-from database.session import get_db
-from sqlalchemy.orm import Session
+from database.models import uuid7
 from routes.auth import auth_router
-from utils.flash import get_flashed_messages
+from utils.logging_setup import configure_logging
+from utils.templating import templates, preload_templates
 from routes.faculty import dashboard, courses, cilos as faculty_cilos
 from routes.faculty.upload_topic import faculty_upload_router
 from routes.student import student_dashboard_router, student_courses_router, cilos as student_cilos
@@ -33,7 +29,7 @@ from routes.student.topics import student_router
 # ----------------------------
 # 🔧 Basic Setup & Config
 # ----------------------------
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+configure_logging()
 
 app = FastAPI(title="MCQ Generator API")
 load_dotenv()
@@ -44,22 +40,49 @@ API_KEY = os.getenv("API_KEY")
 if not API_KEY:
     raise SystemExit("❌ Gemini API key missing in .env file!")
 
-genai.configure(api_key=API_KEY)
-
 # Directories
 CACHE_DIR = Path("./faiss_cache")
 CACHE_DIR.mkdir(exist_ok=True)
-TEMP_UPLOAD_DIR = Path(tempfile.gettempdir()) / "mcq_uploads"
-TEMP_UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+# Off by default so startup keeps the lazy imports cheap; enable both on long-lived
+# servers that should pay the model and index load before the first request
+WARM_MODELS_ON_STARTUP = os.getenv("WARM_MODELS_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+PRELOAD_FAISS_INDEXES = os.getenv("PRELOAD_FAISS_INDEXES", "false").lower() in ("1", "true", "yes")
 
 # ----------------------------
 # ⚙️ Middleware and Templates
 # ----------------------------
 initialize_database()
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY, session_cookie="rag_session")
-templates = Jinja2Templates(directory="templates")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+def _warm_start():
+    """Model first, then the recent FAISS indexes (opening those needs the model)."""
+    if WARM_MODELS_ON_STARTUP:
+        warm_up()
+    if PRELOAD_FAISS_INDEXES:
+        count = preload_vector_stores(CACHE_DIR)
+        logging.info(f"📦 Preloaded {count} FAISS index(es) from {CACHE_DIR}.")
+
+def _log_warm_start_failure(task: asyncio.Task):
+    """Nothing awaits the warm-up task, so its failure is logged here instead of being lost."""
+    if not task.cancelled() and task.exception() is not None:
+        logging.error("❌ Startup warm-up failed", exc_info=task.exception())
+
+@app.on_event("startup")
+async def warm_models():
+    """
+    When enabled, loads the embedding model and the most recent FAISS indexes in
+    the background at startup: the server accepts requests immediately, and the
+    first upload or generation no longer pays the cold load.
+    """
+    # Cheap and local, so done inline before the first request is served
+    logging.info(f"🧩 Preloaded {preload_templates()} template(s).")
+
+    if WARM_MODELS_ON_STARTUP or PRELOAD_FAISS_INDEXES:
+        app.state.warm_up_task = asyncio.create_task(asyncio.to_thread(_warm_start))
+        app.state.warm_up_task.add_done_callback(_log_warm_start_failure)
+
 # ----------------------------
 # 🔌 Routers
 # ----------------------------
@@ -112,7 +135,6 @@ async def upload_pdf(
     file: UploadFile = File(...),
     # 🌟 NEW: user_id is retrieved from the session dependency
     user_id: int = Depends(check_user_role),
-    db: Session = Depends(get_db)
 ) -> JSONResponse:
     """
     Uploads a PDF file, processes or loads it from cache, stores metadata,
@@ -123,25 +145,24 @@ async def upload_pdf(
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are accepted.")
     
-    # --- File Saving and Hashing ---
+    # --- File Reading and Hashing ---
     original_filename = file.filename
-    unique_filename = f"{uuid.uuid4()}-{original_filename}"
-    temp_file_path = TEMP_UPLOAD_DIR / unique_filename
 
     try:
-        # Read file content and save temporarily
-        file_content = await file.read()
-        with open(temp_file_path, "wb") as buffer:
-            buffer.write(file_content)
-        
-        # Calculate a unique content-based hash (used for caching)
-        file_hash = calculate_file_hash(str(temp_file_path))
-        if not file_hash:
-            raise HTTPException(status_code=500, detail="Could not calculate file hash.")
+        # Read the upload in 1 MiB chunks, hashing each chunk as it arrives; the
+        # PDF is parsed straight from these bytes, with no temp-file round-trip
+        hasher = new_file_hasher()
+        file_content = bytearray()
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+            file_content += chunk
+
+        # Unique content-based hash (used for caching)
+        file_hash = hasher.hexdigest()
 
         # --- Indexing Logic ---
         index_path = CACHE_DIR / file_hash
-        document_uuid = str(uuid.uuid4())
+        document_uuid = str(uuid7())
         faiss_action_status = ""
 
         # Check if the FAISS index (vector store) already exists in the cache
@@ -150,18 +171,23 @@ async def upload_pdf(
             faiss_action_status = "loaded_from_cache"
         else:
             logging.info("🆕 Cache miss — creating new FAISS index.")
-            # Load PDF, split into chunks/documents
-            docs = load_and_chunk(str(temp_file_path), document_id=document_uuid)
-            if not docs:
-                raise HTTPException(status_code=500, detail="No readable content found in PDF.")
+            # Stream the PDF as chunks straight into the index build
+            docs = iter_chunks(file_content, document_id=document_uuid)
             
-            # Create embedding, build FAISS index, and save it to index_path
-            _, faiss_action_status = get_or_create_vector_store(str(index_path), docs=docs)
+            # Parse, embed, build the FAISS index and save it to index_path in a
+            # worker thread (the chunk generator is consumed there), so the event
+            # loop keeps serving other requests
+            try:
+                _, faiss_action_status = await asyncio.to_thread(get_or_create_vector_store, str(index_path), docs)
+            except ValueError:
+                raise HTTPException(status_code=500, detail="No readable content found in PDF.")
 
             # --- Database Storage  ---
             try:
                 # Store the original filename, hash/path, and document_uuid in postgre
-                save_document(
+                # (sync SQLAlchemy session, so it runs in a worker thread)
+                await asyncio.to_thread(
+                    save_document,
                     original_filename, 
                     file_hash,
                     str(index_path), 
@@ -188,20 +214,20 @@ async def upload_pdf(
     except Exception as e:
         logging.error(f"❌ An unhandled error occurred in /upload-pdf/: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
-    finally:
-        # Cleanup temp file
-        if temp_file_path.exists():
-            os.remove(temp_file_path)
-            logging.info(f"🧹 Temporary file removed: {temp_file_path}")
 
 
 
+# Caps concurrent FAISS searches running in worker threads
+_retrieval_semaphore = asyncio.Semaphore(8)
+
+
 @app.post("/generate-question/")
 async def generate_question(
     pdf_hash_id: str = Form(..., description="The unique hash ID returned by /upload-pdf/"),
     topics: str = Form(..., description="Comma-separated list of topics"),
     num_questions: int = Form(..., description="Number of questions (1-10)"),
     co_tags: str = Form(..., description="Comma-separated CO tags (e.g., CO1,CO2)"),
+    force_refresh: bool = Form(False, description="Regenerate even if an identical request was answered before"),
 ) -> JSONResponse:
 
     # Validate number of questions
@@ -223,13 +249,30 @@ async def generate_question(
     if not index_path.exists():
         raise HTTPException(status_code=404, detail="Document index not found. Upload PDF first.")
 
-    retriever, _ = get_or_create_vector_store(str(index_path))
+    # Identical requests (common while previewing) are answered from memory
+    cache_key = mcq_cache_key(pdf_hash_id, topic_list, co_tag_list, num_questions)
+    cached = None if force_refresh else get_cached_mcqs(cache_key)
+    if cached is not None:
+        logging.info("📦 MCQ cache hit — skipping retrieval and generation.")
+        return JSONResponse({
+            "status": "success",
+            "pdf_hash_id": pdf_hash_id,
+            "topics": topic_list,
+            "generated_mcqs": cached["questions"],
+            "retrieved_chunks_count": cached["retrieved_chunks_count"]
+        })
 
-    # Retrieve chunks for each topic
-    all_retrieved_chunks = []
-    for topic in topic_list:
-        docs = retriever.get_relevant_documents(topic)[:2]
-        all_retrieved_chunks.extend(docs)
+    # Opening an index that is not in memory yet reads from disk
+    vector_store, _ = await asyncio.to_thread(get_or_create_vector_store, str(index_path))
+
+    # Topic embeddings are batched together with other in-flight requests,
+    # then searched by vector off the event loop
+    topic_vectors = await query_encoder.embed(topic_list)
+    async with _retrieval_semaphore:
+        results = await asyncio.to_thread(search_by_vectors, vector_store, topic_vectors, 2)
+    all_retrieved_chunks = [d for docs in results for d in docs]
+    # Per-topic chunks, so each concurrent generation call only sends its own topics' material
+    topic_chunks = {topic: [d.page_content for d in docs] for topic, docs in zip(topic_list, results)}
 
     merged_context = "\n\n".join([d.page_content for d in all_retrieved_chunks])
     retrieved_chunk_texts = [d.page_content for d in all_retrieved_chunks]
@@ -240,11 +283,12 @@ async def generate_question(
     # Run LLM chain
     chain = build_chain()
     try:
-        generated_data = chain.run(
+        generated_data = await chain.arun(
             topics=topic_list,
             context=merged_context,
             num_questions=num_questions,
-            co_tags=co_tag_list
+            co_tags=co_tag_list,
+            topic_chunks=topic_chunks
         )
 
         questions_list = generated_data.get("questions", [])
@@ -253,6 +297,11 @@ async def generate_question(
         logging.error(f"Chain error: {e}")
         raise HTTPException(status_code=500, detail="AI failed to generate questions")
 
+    cache_mcqs(cache_key, {
+        "questions": questions_list,
+        "retrieved_chunks_count": len(all_retrieved_chunks)
+    })
+
     # Return successful JSON
     return JSONResponse({
         "status": "success",
@@ -271,7 +320,7 @@ async def get_documents() -> JSONResponse:
     """
     try:
         # Query the PostgreSQL table for document data
-        document_list = retrieve_all_documents_metadata() 
+        document_list = await asyncio.to_thread(retrieve_all_documents_metadata)
         
         return JSONResponse({
             "status": "success",
@@ -1,16 +1,13 @@
 from fastapi import APIRouter, Form, Depends, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session
-from starlette.templating import Jinja2Templates
 
 # Local Imports
 from database.models import User
 from database.session import get_db
 
 from utils.flash import flash, get_flashed_messages
-
-# Templates setup
-templates = Jinja2Templates(directory="templates")
+from utils.templating import templates
 
 auth_router = APIRouter(prefix="/auth", tags=["Auth"])
 
@@ -73,6 +70,7 @@ def register(
     request.session["user_id"] = new_user.id
     request.session["user"] = new_user.username
     request.session["role"] = new_user.role
+    request.session["full_name"] = new_user.full_name
     
     flash(request, "Registration successful. You are now logged in.", "success")
     return RedirectResponse(url=get_dashboard_redirect(new_user.role), status_code=303)
@@ -96,10 +94,15 @@ def login(
         flash(request, f"Invalid role selected for user '{username}'.", "danger")
         return RedirectResponse(url="/auth/login", status_code=303)
     
+    # Persist a password hash that check_password upgraded (e.g. bcrypt -> argon2)
+    if db.is_modified(user):
+        db.commit()
+    
     # Set session
     request.session["user_id"] = user.id
     request.session["user"] = user.username
     request.session["role"] = user.role
+    request.session["full_name"] = user.full_name
     
     flash(request, f"Welcome back, {user.full_name}!", "success")
     return RedirectResponse(url=get_dashboard_redirect(user.role), status_code=303)
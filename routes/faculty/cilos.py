@@ -1,14 +1,13 @@
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy.orm import Session
-from starlette.templating import Jinja2Templates
-
+from sqlalchemy.orm import Session, selectinload, raiseload
 
 from database.session import get_db
-from database.models import User, Course, CILO 
+from database.check_user_role import get_session_full_name
+from database.models import User, Course
+from utils.templating import templates
 
 faculty_router = APIRouter(prefix="/faculty", tags=["Faculty"])
-templates = Jinja2Templates(directory="templates")
 
 @faculty_router.get("/cilos", response_class=HTMLResponse)
 def view_cilos_faculty(request: Request, db: Session = Depends(get_db)):
@@ -19,28 +18,34 @@ def view_cilos_faculty(request: Request, db: Session = Depends(get_db)):
     if not user_id:
         return RedirectResponse(url="/auth/login", status_code=303)
 
-    # 2️⃣ Get logged-in faculty
-    faculty = db.query(User).filter(User.id == user_id).first()
-    if not faculty or faculty.role != "faculty":
+    # 2️⃣ Get logged-in faculty (name and role are cached in the session at login)
+    full_name = get_session_full_name(request, db)
+    if full_name is None or request.session.get("role") != "faculty":
         return RedirectResponse(url="/auth/login", status_code=303)
-
-    # 3️⃣ Get courses 
-    courses = db.query(Course).filter(Course.instructor_id == faculty.id).all()
-
-    # 4️⃣ Get students (simplified: all users with role="student")
-    students = db.query(User).filter(User.role == "student").all()
+    faculty = {"id": user_id, "full_name": full_name}
+
+    # 3️⃣ Get courses, with all their CILOs loaded by one extra IN query
+    # (the instructor join is skipped; any other lazy load raises)
+    courses = (
+        db.query(Course)
+        .options(selectinload(Course.cilos), raiseload("*"))
+        .filter(Course.instructor_id == user_id)
+        .all()
+    )
+
+    # 4️⃣ Get students (simplified: all users with role="student");
+    # the template only reads id and full_name, so skip hashes and the rest of the row
+    students = db.query(User.id, User.full_name).filter(User.role == "student").all()
     
-    # 5️⃣ Get CILOs 
-    course_data = []
-    
-    for course in courses:
-        cilos_list = db.query(CILO).filter(CILO.course_id == course.id).all()
-        
-        course_data.append({
+    # 5️⃣ Build course data from the already-loaded CILOs
+    course_data = [
+        {
             "id": course.id,      
             "title": course.title,
-            "cilos": cilos_list         
-        })
+            "cilos": course.cilos         
+        }
+        for course in courses
+    ]
 
     return templates.TemplateResponse(
         "faculty/cilos.html",
@@ -1,12 +1,12 @@
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session
-from starlette.templating import Jinja2Templates
 from database.session import get_db
-from database.models import Course, User
+from database.check_user_role import get_session_full_name
+from database.course_db import get_all_courses
+from utils.templating import templates
 
 faculty_router = APIRouter(prefix="/faculty", tags=["Faculty"])
-templates = Jinja2Templates(directory="templates")
 
 @faculty_router.get("/courses", response_class=HTMLResponse)
 def faculty_courses(request: Request, db: Session = Depends(get_db)):
@@ -16,20 +16,16 @@ def faculty_courses(request: Request, db: Session = Depends(get_db)):
     if not user_id:
         return RedirectResponse(url="/auth/login", status_code=303)
 
-    # 🔑 STEP B: FETCH USER OBJECT
-    # Query the User model to get the full_name
-    user = db.query(User).filter(User.id == user_id).first()
-    
+    # 🔑 STEP B: RETRIEVE FULL NAME (cached in the session at login)
+    user_full_name = get_session_full_name(request, db)
+
     # Handle user not found (security check)
-    if not user:
+    if user_full_name is None:
         request.session.clear()
         return RedirectResponse(url="/auth/login", status_code=303)
-
-    # 🔑 STEP C: RETRIEVE FULL NAME
-    user_full_name = user.full_name
     
     # Fetch all courses 
-    courses = db.query(Course).all()
+    courses = get_all_courses(db)
 
     return templates.TemplateResponse(
         "faculty/courses.html",
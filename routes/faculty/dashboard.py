@@ -1,15 +1,16 @@
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy.orm import Session
-from starlette.templating import Jinja2Templates
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session, joinedload, raiseload
 
 from database.session import get_db
+from database.check_user_role import get_session_full_name
 from database.models import Course, User, Topic 
 from utils.flash import get_flashed_messages
+from utils.templating import templates
    
 
 faculty_router = APIRouter(prefix="/faculty", tags=["Faculty"])
-templates = Jinja2Templates(directory="templates")
 
 @faculty_router.get("/dashboard", response_class=HTMLResponse)
 def faculty_dashboard(request: Request, db: Session = Depends(get_db)):
@@ -17,27 +18,33 @@ def faculty_dashboard(request: Request, db: Session = Depends(get_db)):
     if not user_id:
         return RedirectResponse(url="/auth/login", status_code=303)
 
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    user_full_name = get_session_full_name(request, db)
+    if user_full_name is None:
         request.session.clear()
         return RedirectResponse(url="/auth/login", status_code=303)
-
-    user_full_name = user.full_name
     
-    # Get all courses handled by this faculty
-    courses = db.query(Course).filter(Course.instructor_id == user_id).all()
+    # Get all courses handled by this faculty; the cards show the instructor but not the CILOs
+    courses = (
+        db.query(Course)
+        .options(joinedload(Course.instructor), raiseload("*"))
+        .filter(Course.instructor_id == user_id)
+        .all()
+    )
     course_count = len(courses)
 
-    # ✅ Count all uploaded topics for this faculty
-    topic_count = (
-        db.query(Topic)
+    # ✅ Count uploaded topics for this faculty and all registered students in one round-trip
+    topic_count_subq = (
+        select(func.count(Topic.id))
         .join(Course, Course.id == Topic.course_id)
-        .filter(Course.instructor_id == user_id)
-        .count()
+        .where(Course.instructor_id == user_id)
+        .scalar_subquery()
     )
-
-    # ✅ Count all registered students
-    student_count = db.query(User).filter(User.role == "student").count()
+    student_count_subq = (
+        select(func.count(User.id))
+        .where(User.role == "student")
+        .scalar_subquery()
+    )
+    topic_count, student_count = db.execute(select(topic_count_subq, student_count_subq)).one()
 
     flashed = get_flashed_messages(request)
 
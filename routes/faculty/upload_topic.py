@@ -1,41 +1,124 @@
 from fastapi import APIRouter, Request, Depends, UploadFile, File, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
-from sqlalchemy.orm import Session
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, Response
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, raiseload
 import os
 import shutil
+import tempfile
 from typing import Optional
 import mimetypes
 from pathlib import Path
 
+from core.processing import new_file_hasher
 from database.session import get_db
-from database.models import Topic, Course, User
+from database.check_user_role import get_session_full_name
+from database.models import Topic, Course
 from utils.flash import flash, get_flashed_messages
+from utils.templating import templates
 
 faculty_upload_router = APIRouter(prefix="/faculty", tags=["Faculty"])
-templates = Jinja2Templates(directory="templates")
-templates.env.globals["get_flashed_messages"] = get_flashed_messages
 
 UPLOAD_DIR = "uploads/topics"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Uploads are copied to disk in 1 MiB chunks
+UPLOAD_COPY_CHUNK_SIZE = 1 << 20
+# Uploads up to this size are hashed in memory before being written; larger ones roll over to a temp file
+UPLOAD_SPOOL_MAX_SIZE = 8 << 20
 
 # ----------------------------
-# Helper: User Dependency
+# Helper: Content-Addressed Uploads
 # ----------------------------
-def get_current_faculty(request: Request, db: Session = Depends(get_db)):
-    user_id = request.session.get("user_id")
-    if not user_id:
-       
-        return RedirectResponse(url="/auth/login", status_code=303) 
-    
-    # Query the user 
-    user = db.query(User).filter(User.id == user_id).first()
-    
-    if not user or user.role != 'faculty':
-        request.session.clear()
-        return RedirectResponse(url="/auth/login", status_code=303)
-        
-    return user
+# Files are stored as UPLOAD_DIR/<content hash><ext>: identical uploads share one
+# file on disk, and the original name lives only in Topic.file_name.
+def spool_upload(upload: UploadFile):
+    """
+    Hashes the upload into a SpooledTemporaryFile and returns (spool, hex digest),
+    so duplicates can be rejected before anything is written to UPLOAD_DIR.
+    """
+    hasher = new_file_hasher()
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_SIZE)
+    while chunk := upload.file.read(UPLOAD_COPY_CHUNK_SIZE):
+        hasher.update(chunk)
+        spool.write(chunk)
+    spool.seek(0)
+    return spool, hasher.hexdigest()
+
+def content_path(file_hash: str, filename: str) -> Path:
+    """Storage path for a file with this content hash (the extension is kept for MIME detection)."""
+    return Path(UPLOAD_DIR) / f"{file_hash}{Path(filename).suffix.lower()}"
+
+def lock_stored_file(db: Session, path) -> None:
+    """
+    Takes a transaction-scoped advisory lock on a stored file path. Writers hold it
+    from store_spool until their commit, and remove_unreferenced_file holds it while
+    it checks and deletes, so a file is never removed under an upload that is about
+    to reference it.
+    """
+    db.execute(select(func.pg_advisory_xact_lock(func.hashtext(str(path)))))
+
+def store_spool(spool, dest: Path) -> bool:
+    """
+    Writes the spooled upload to `dest` unless that content is already stored.
+    Returns True if a new file was written. The copy goes through a uniquely named
+    temp file and an atomic rename, so a concurrent reader never sees a partial file.
+    """
+    with spool:
+        if dest.exists():
+            return False
+        fd, tmp_path = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                shutil.copyfileobj(spool, f, length=UPLOAD_COPY_CHUNK_SIZE)
+            os.replace(tmp_path, dest)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return True
+
+def discard_stored_file(db: Session, path: Path, created: bool) -> None:
+    """
+    Rolls back a failed save. A file this request wrote is removed first, while the
+    path lock is still held, so no other upload can start relying on it.
+    """
+    try:
+        if created and path.exists():
+            os.remove(path)
+    finally:
+        db.rollback()
+
+def remove_unreferenced_file(db: Session, path: Optional[str]) -> None:
+    """Deletes a stored file once no topic points at it any more (files are shared by content)."""
+    if not path:
+        return
+    try:
+        lock_stored_file(db, path)
+        if db.query(Topic.id).filter(Topic.file_path == path).first():
+            return
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Warning: Could not delete file {path}: {e}")
+    finally:
+        # Nothing to persist; ending the transaction releases the path lock
+        db.rollback()
+
+# ----------------------------
+# Helper: Duplicate Topic Message
+# ----------------------------
+DUPLICATE_TOPIC_MESSAGES = {
+    "uq_topic_course_topicno": "Upload failed: Topic No. {topic_no} already exists in this course.",
+    "uq_topic_course_file_name": "Upload failed: a topic with file '{filename}' already exists in this course.",
+    "uq_topic_course_hash": "Upload failed: this file is already uploaded to this course.",
+}
+
+def duplicate_topic_message(error: IntegrityError, topic_no: int, filename: str) -> str:
+    """Flash message for the Topic unique constraint that `error` violated."""
+    constraint = getattr(getattr(error.orig, "diag", None), "constraint_name", None)
+    template = DUPLICATE_TOPIC_MESSAGES.get(constraint, "Upload failed: this topic already exists in this course.")
+    return template.format(topic_no=topic_no, filename=filename)
 
 # ---------------------------------
 # GET: Display Upload Page
@@ -46,16 +129,15 @@ def upload_topic_page(course_id: int, request: Request, db: Session = Depends(ge
     if not user_id:
         return RedirectResponse(url="/auth/login", status_code=303)
 
-    # 🔑 STEP 1: FETCH USER 
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    # 🔑 STEP 1: GET THE FULL NAME (cached in the session at login)
+    user_full_name = get_session_full_name(request, db)
+    if user_full_name is None:
         request.session.clear()
         return RedirectResponse(url="/auth/login", status_code=303)
-    
-    user_full_name = user.full_name # Get the full name
 
-    course = db.query(Course).filter(Course.id == course_id).first()
-    if not course:
+    # Existence check only
+    course_exists = db.query(Course.id).filter(Course.id == course_id).first()
+    if not course_exists:
         raise HTTPException(status_code=404, detail=f"Course ID {course_id} not found.")
 
     topics = db.query(Topic).filter(Topic.course_id == course_id).order_by(Topic.topic_no).all()
@@ -75,8 +157,10 @@ def upload_topic_page(course_id: int, request: Request, db: Session = Depends(ge
 BASE_UPLOAD_DIR = Path("uploads/topics") 
 BASE_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# Plain `def`: the file copy, hashing and DB work all block, so FastAPI runs this
+# handler in its threadpool instead of on the event loop
 @faculty_upload_router.post("/course/{course_id}/upload_topic", name="upload_topic")
-async def upload_topic(
+def upload_topic(
     course_id: int,
     request: Request,
     title: str = Form(...),
@@ -88,54 +172,48 @@ async def upload_topic(
     if not request.session.get("user_id"):
         return RedirectResponse(url="/auth/login", status_code=303)
 
-    # Prepare file path
+    # Hash the upload first; nothing is written to disk until the topic row is accepted
     original_filename = Path(file.filename).name
-    server_file_path = BASE_UPLOAD_DIR / original_filename
-
-    print(f"DEBUG CHECKING PATH: {server_file_path.resolve()}")
-
-    # Check if file already exists
-    existing_topic = db.query(Topic).filter(
-        Topic.course_id == course_id,
-        Topic.file_path.like(f"%{original_filename}%")
-    ).first()
-
-    if existing_topic:
-        flash(
-            request,
-            f"Upload failed: Topic '{existing_topic.title}' (Topic No. {existing_topic.topic_no}) already exists with file '{original_filename}'.",
-            category="warning"
-        )
+    spool, file_hash = spool_upload(file)
+    server_file_path = content_path(file_hash, original_filename)
+
+    # Insert the topic; the unique constraints on Topic reject duplicates in the same round-trip
+    new_topic = Topic(
+        topic_no=topic_no,
+        title=title,
+        subtitle=subtitle,
+        file_path=str(server_file_path),
+        file_name=original_filename,
+        file_hash=file_hash,
+        course_id=course_id
+    )
+    try:
+        db.add(new_topic)
+        db.flush()
+    except IntegrityError as e:
+        db.rollback()
+        spool.close()
+        flash(request, duplicate_topic_message(e, topic_no, original_filename), category="warning")
         return RedirectResponse(
             url=f"/faculty/course/{course_id}/upload_topic",
             status_code=303
         )
 
-    # Save file to disk
+    # Save file to disk (skipped if this content is already stored), then commit the row
+    created = False
     try:
-        with open(server_file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        lock_stored_file(db, server_file_path)
+        created = store_spool(spool, server_file_path)
     except Exception as e:
+        discard_stored_file(db, server_file_path, created)
         print(f"File I/O Error: {e}")
         raise HTTPException(status_code=500, detail="Could not save file to the server due to an I/O error.")
 
-    # Save topic to database
     try:
-        new_topic = Topic(
-            topic_no=topic_no,
-            title=title,
-            subtitle=subtitle,
-            file_path=str(server_file_path),
-            course_id=course_id
-        )
-        db.add(new_topic)
         db.commit()
-        db.refresh(new_topic)
     except Exception as e:
-        db.rollback()
-        # Remove file if DB save fails
-        if server_file_path.exists():
-            os.remove(server_file_path)
+        # Remove file if DB save fails (only if this request wrote it)
+        discard_stored_file(db, server_file_path, created)
         print(f"Database save error: {e}")
         raise HTTPException(status_code=500, detail="Database error. Topic could not be saved.")
 
@@ -148,8 +226,9 @@ async def upload_topic(
 # ---------------------------------
 # POST: Update Topic
 # ---------------------------------
+# Plain `def` for the same reason as upload_topic: file replacement and DB work block
 @faculty_upload_router.post("/update_topic/{topic_id}", name="update_topic")
-async def update_topic(
+def update_topic(
     topic_id: int,
     request: Request,
     title: str = Form(...),
@@ -166,27 +245,60 @@ async def update_topic(
 
     topic.title = title
     topic.subtitle = subtitle
+    old_file_path = topic.file_path
+    course_id = topic.course_id
 
+    spool = None
     if file and file.filename:
         os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-        
-        if topic.file_path and os.path.exists(topic.file_path):
-            os.remove(topic.file_path)
+        # Point the topic at the new content; the old file is removed after commit if unused
+        original_filename = Path(file.filename).name
+        spool, file_hash = spool_upload(file)
+        topic.file_hash = file_hash
+        topic.file_name = original_filename
+        topic.file_path = str(content_path(file_hash, original_filename))
+
+    try:
+        db.flush()
+    except IntegrityError as e:
+        db.rollback()
+        if spool:
+            spool.close()
+        flash(request, duplicate_topic_message(e, topic.topic_no, file.filename), "warning")
+        return RedirectResponse(
+            url=f"/faculty/course/{course_id}/upload_topic",
+            status_code=303
+        )
 
-        # Save new file
-        file_location = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_location, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-        topic.file_path = file_location
+    created = False
+    if spool:
+        new_file_path = Path(topic.file_path)
+        try:
+            lock_stored_file(db, new_file_path)
+            created = store_spool(spool, new_file_path)
+        except Exception as e:
+            discard_stored_file(db, new_file_path, created)
+            print(f"File I/O Error: {e}")
+            raise HTTPException(status_code=500, detail="Could not save file to the server due to an I/O error.")
 
-    db.commit()
-    db.refresh(topic)
+    try:
+        db.commit()
+    except Exception as e:
+        if spool:
+            discard_stored_file(db, new_file_path, created)
+        else:
+            db.rollback()
+        print(f"Database save error: {e}")
+        raise HTTPException(status_code=500, detail="Database error. Topic could not be updated.")
+
+    if old_file_path and old_file_path != topic.file_path:
+        remove_unreferenced_file(db, old_file_path)
 
     flash(request, f"Topic '{title}' updated successfully!", "info")
 
     return RedirectResponse(
-        url=f"/faculty/course/{topic.course_id}/upload_topic",
+        url=f"/faculty/course/{course_id}/upload_topic",
         status_code=303
     )
 
@@ -206,18 +318,15 @@ def delete_topic(topic_id: int, request: Request, db: Session = Depends(get_db))
 
     course_id = topic.course_id
     topic_title = topic.title  
-
-    # Delete file if exists
-    if topic.file_path and os.path.exists(topic.file_path):
-        try:
-            os.remove(topic.file_path)
-        except Exception as e:
-            print(f"Warning: Could not delete file {topic.file_path}: {e}")
+    file_path = topic.file_path
 
     # Delete from DB
     db.delete(topic)
     db.commit()
 
+    # Delete file if no other topic shares it
+    remove_unreferenced_file(db, file_path)
+
     # Flash message
     flash(request, f"Topic '{topic.title}' deleted successfully!", "success")
 
@@ -231,20 +340,47 @@ def delete_topic(topic_id: int, request: Request, db: Session = Depends(get_db))
 # GET: View Topic File
 # ---------------------------------
 
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match already names `etag` (weak or strong)."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates or "*" in candidates
+
+
 @faculty_upload_router.get("/topic/view/{topic_id}", name="view_topic_file")
 def view_topic_file(topic_id: int, request: Request, db: Session = Depends(get_db)):
     topic = db.query(Topic).filter(Topic.id == topic_id).first()
-    if not topic or not topic.file_path or not os.path.exists(topic.file_path):
+    if not topic or not topic.file_path:
+        raise HTTPException(status_code=404, detail="File not found.")
+    try:
+        # Reused by FileResponse, so the file is stat'ed once per request
+        file_stat = os.stat(topic.file_path)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found.")
 
+    # The content hash is a strong validator: a browser that already has this file
+    # gets an empty 304 instead of the whole PDF. no-cache makes it revalidate every
+    # time, since replacing the file keeps the same URL.
+    headers = {"Cache-Control": "private, no-cache"}
+    if topic.file_hash:
+        etag = f'"{topic.file_hash}"'
+        headers["ETag"] = etag
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
     mime_type, _ = mimetypes.guess_type(topic.file_path)
     if not mime_type:
         mime_type = 'application/octet-stream'
 
-   
     return FileResponse(
         path=topic.file_path,
-        media_type=mime_type
+        media_type=mime_type,
+        headers=headers,
+        filename=topic.original_filename,
+        content_disposition_type="inline",
+        stat_result=file_stat
     )
 
 
@@ -256,11 +392,17 @@ def view_uploaded_topics(course_id: int, request: Request, db: Session = Depends
     if not request.session.get("user_id"):
         return RedirectResponse(url="/auth/login", status_code=303)
 
-    course = db.query(Course).filter(Course.id == course_id).first()
+    # Course and its topics (ordered by topic_no) in one joined query
+    course = (
+        db.query(Course)
+        .options(joinedload(Course.topics), raiseload("*"))
+        .filter(Course.id == course_id)
+        .first()
+    )
     if not course:
         raise HTTPException(status_code=404, detail="Course not found.")
 
-    topics = db.query(Topic).filter(Topic.course_id == course_id).order_by(Topic.topic_no).all()
+    topics = course.topics
 
     flashed = get_flashed_messages(request)
 
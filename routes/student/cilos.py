@@ -1,13 +1,12 @@
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session
-from starlette.templating import Jinja2Templates
 
 from database.session import get_db
-from database.models import User  
+from database.check_user_role import get_session_full_name
+from utils.templating import templates
 
 student_router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 
 @student_router.get("/student/cilos", response_class=HTMLResponse, name="view_cilos_student")
@@ -19,10 +18,11 @@ def view_cilos_student(request: Request, db: Session = Depends(get_db)):
     if not user_id:
         return RedirectResponse(url="/auth/login", status_code=303)
 
-    # ✅ 2️⃣ Get the logged-in user
-    student = db.query(User).filter(User.id == user_id).first()
-    if not student:
+    # ✅ 2️⃣ Get the logged-in user (name is cached in the session at login)
+    full_name = get_session_full_name(request, db)
+    if full_name is None:
         return RedirectResponse(url="/auth/login", status_code=303)
+    student = {"id": user_id, "full_name": full_name}
 
     # ✅ 3️⃣ Render static template (only student info is dynamic for now)
     return templates.TemplateResponse(
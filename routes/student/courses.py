@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session
-from starlette.templating import Jinja2Templates
 from database.session import get_db
-from database.models import Course, User, DownloadHistory
+from database.check_user_role import get_session_full_name
+from database.course_db import get_all_courses
+from database.models import DownloadHistory
+from utils.templating import templates
 
 router = APIRouter(prefix="/student", tags=["Student Courses"])
-templates = Jinja2Templates(directory="templates")
 
 @router.get("/courses", response_class=HTMLResponse)
 def student_courses(request: Request, db: Session = Depends(get_db)):
@@ -17,13 +18,14 @@ def student_courses(request: Request, db: Session = Depends(get_db)):
     if not user_id:
         return RedirectResponse(url="/auth/login", status_code=303)
 
-    # Fetch logged-in student
-    student = db.query(User).filter(User.id == user_id).first()
-    if not student:
+    # Fetch logged-in student (name is cached in the session at login)
+    full_name = get_session_full_name(request, db)
+    if full_name is None:
         return RedirectResponse(url="/auth/login", status_code=303)
+    student = {"id": user_id, "full_name": full_name}
 
     # show all courses
-    courses = db.query(Course).all()
+    courses = get_all_courses(db)
 
      # Get recent downloads
     downloads = (
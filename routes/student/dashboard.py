@@ -1,14 +1,14 @@
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session
-from starlette.templating import Jinja2Templates
 from database.session import get_db
-from database.models import Course, User
+from database.check_user_role import get_session_full_name
+from database.course_db import get_all_courses
 from utils.flash import get_flashed_messages
+from utils.templating import templates
 
 # Router for student dashboard
 router = APIRouter(prefix="/student", tags=["Student"])
-templates = Jinja2Templates(directory="templates")
 
 @router.get("/dashboard", response_class=HTMLResponse)
 def student_dashboard(request: Request, db: Session = Depends(get_db)):
@@ -19,16 +19,18 @@ def student_dashboard(request: Request, db: Session = Depends(get_db)):
     if not user_id:
         return RedirectResponse(url="/auth/login", status_code=303)
 
-    # Fetch user info
-    student = db.query(User).filter(User.id == user_id).first()
-    if not student:
+    # Fetch user info (name is cached in the session at login)
+    full_name = get_session_full_name(request, db)
+    if full_name is None:
         return RedirectResponse(url="/auth/login", status_code=303)
+    student = {"id": user_id, "full_name": full_name}
 
 
-    courses = db.query(Course).all()
+    courses = get_all_courses(db)
 
-     # ✅ Count available courses (or enrolled once you add enrollment feature)
-    course_count = db.query(Course).count()
+     # ✅ Count available courses (or enrolled once you add enrollment feature);
+    # the list is already loaded, so no second COUNT query
+    course_count = len(courses)
 
     flashed = get_flashed_messages(request)
 
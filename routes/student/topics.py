@@ -1,18 +1,19 @@
 from fastapi import APIRouter, Request, Depends, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
-from sqlalchemy.orm import Session
-from starlette.templating import Jinja2Templates
+from sqlalchemy.orm import Session, joinedload, raiseload
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import ProgrammingError
 import os
 from datetime import datetime
 
 
 from database.session import get_db
 from database.models import Topic, Course, DownloadHistory
+from utils.templating import templates
 
 
 # --- Setup ---
 student_router = APIRouter(prefix="/student", tags=["Student"])
-templates = Jinja2Templates(directory="templates")
 
 # Configuration (Used for file viewing/downloading)
 UPLOAD_DIR = "uploads/topics"
@@ -21,20 +22,6 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # --- Routes ---
 
-## 📚 GET: Student Course List (Target for the 'Back' button)
-@student_router.get("/courses", response_class=HTMLResponse, name="student_courses")
-def student_course_list_placeholder(request: Request):
-    """Placeholder for the student's main course list/dashboard view."""
-    if not request.session.get("user_id"):
-        return RedirectResponse(url="/auth/login", status_code=303)
-    
-    # Renders a simple course list page 
-    return templates.TemplateResponse("student/courses.html", {
-        "request": request,
-        "courses": [], 
-    })
-
-
 ## 👁️ GET: Student Topic View (The Topic List)
 
 @student_router.get(
@@ -52,13 +39,19 @@ def view_course_topics_student(
     if not request.session.get("user_id"):
         return RedirectResponse(url="/auth/login", status_code=303)
 
-    # 2. Fetch Course Details
-    course = db.query(Course).filter(Course.id == course_id).first()
+    # 2. Fetch Course Details with its topics (ordered by topic_no) in one joined query;
+    # skip the default instructor/CILO loads
+    course = (
+        db.query(Course)
+        .options(joinedload(Course.topics), raiseload("*"))
+        .filter(Course.id == course_id)
+        .first()
+    )
     if not course:
         raise HTTPException(status_code=404, detail="Course not found.")
 
-    # 3. Fetch Topics filtered by the Course ID
-    topics = db.query(Topic).filter(Topic.course_id == course_id).order_by(Topic.topic_no).all()
+    # 3. Topics for the Course ID, already loaded
+    topics = course.topics
 
     # 4. Render the Template 
     return templates.TemplateResponse("student/topics.html", {
@@ -90,33 +83,60 @@ def download_topic_file(topic_id: int, request: Request, db: Session = Depends(g
     relative_db_path = topic.file_path
     
     file_path = relative_db_path 
-    filename = os.path.basename(file_path)
+    filename = topic.original_filename
 
-    if not os.path.exists(file_path):
+    # One stat serves the existence check, the recorded size and FileResponse's headers
+    try:
+        file_stat = os.stat(file_path)
+    except FileNotFoundError:
         print(f"DEBUG: File not found at path: {os.path.abspath(file_path)}")
         raise HTTPException(status_code=404, detail="File not found on server.")
 
     # 3. Record Download History
-    file_size = os.path.getsize(file_path) 
-    existing = db.query(DownloadHistory).filter_by(user_id=user_id, topic_id=topic_id).first()
-
-    if not existing:
-        new_download = DownloadHistory(
-            user_id=user_id,
-            topic_id=topic_id,
-            filename=filename, 
-            file_size=file_size,
-            downloaded_at=datetime.utcnow()
-        )
-        db.add(new_download)
+    file_size = file_stat.st_size
+    downloaded_at = datetime.utcnow()
+
+    download = {
+        "user_id": user_id,
+        "topic_id": topic_id,
+        "filename": filename,
+        "file_size": file_size,
+        "downloaded_at": downloaded_at,
+    }
+
+    # Single round-trip: insert the first download, or refresh it. update_topic can
+    # replace the file, so the name and size are refreshed along with the timestamp.
+    stmt = insert(DownloadHistory).values(**download)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "topic_id"],
+        set_={
+            "filename": stmt.excluded.filename,
+            "file_size": stmt.excluded.file_size,
+            "downloaded_at": stmt.excluded.downloaded_at,
+        },
+    )
+    try:
+        db.execute(stmt)
+        db.commit()
+    except ProgrammingError as e:
+        # ON CONFLICT needs uq_download_history_user_topic; databases without it yet take two round-trips
+        db.rollback()
+        print(f"Warning: download upsert unavailable, falling back to select + write: {e.orig}")
+        existing = db.query(DownloadHistory).filter_by(user_id=user_id, topic_id=topic_id).first()
+        if existing:
+            existing.filename = filename
+            existing.file_size = file_size
+            existing.downloaded_at = downloaded_at
+        else:
+            db.add(DownloadHistory(**download))
         db.commit()
-        db.refresh(new_download)
 
     # Serve file
     return FileResponse(
         path=file_path,
         filename=filename,
-        media_type="application/octet-stream"
+        media_type="application/octet-stream",
+        stat_result=file_stat
     )
 
 
@@ -1,39 +1,38 @@
 from starlette.requests import Request
 from starlette.responses import Response
 
+# Defaults per category; anything else (info, warning, ...) gets the generic ones
+FLASH_TITLES = {"success": "Success", "danger": "Error"}
+FLASH_ICONS = {
+    "success": '<i class="fa-regular fa-circle-check"></i>',
+    "danger": '<i class="fa-solid fa-circle-exclamation"></i>',
+}
+DEFAULT_FLASH_TITLE = "Heads Up!"
+DEFAULT_FLASH_ICON = "💡"
+
 def flash(request: Request, message: str, category: str = "info", title: str = None, icon: str = None):
     """
     Stores a message in the session to be displayed on the next request.
     Applies default title and Font Awesome icons based on category (success/danger).
+    Empty messages are ignored, leaving the session untouched.
     """
+    if not message:
+        return
+
     if title is None:
-        if category == "success":
-            title = "Success"
-        elif category == "danger":
-            title = "Error"
-        else:
-            title = "Heads Up!" 
+        title = FLASH_TITLES.get(category, DEFAULT_FLASH_TITLE)
 
     if icon is None:
-        if category == "success":
-            icon = '<i class="fa-regular fa-circle-check"></i>' 
-        elif category == "danger":
-            icon = '<i class="fa-solid fa-circle-exclamation"></i>'
-        else:
-            icon = "💡" 
+        icon = FLASH_ICONS.get(category, DEFAULT_FLASH_ICON)
 
-    request.session["flash_message"] = message
-    request.session["flash_category"] = category
-    request.session["flash_title"] = title
-    request.session["flash_icon"] = icon
+    # One session key for the whole message, so the cookie carries a single entry
+    request.session["flash"] = {"message": message, "category": category, "title": title, "icon": icon}
 
 def get_flashed_messages(request: Request) -> dict:
     """
     Retrieves and clears (pops) the stored flash message from the session.
     """
-    return {
-        "message": request.session.pop("flash_message", None),
-        "category": request.session.pop("flash_category", "info"),
-        "title": request.session.pop("flash_title", "Heads Up!"),
-        "icon": request.session.pop("flash_icon", "💡"),
-    }
+    flashed = request.session.pop("flash", None)
+    if flashed is None:
+        return {"message": None, "category": "info", "title": DEFAULT_FLASH_TITLE, "icon": DEFAULT_FLASH_ICON}
+    return flashed
@@ -0,0 +1,33 @@
+import os
+import queue
+import atexit
+import logging
+import logging.handlers
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+_listener = None
+
+def configure_logging(level=None):
+    """
+    Sets up root logging once for the app. Records are put on an in-memory queue
+    and written to stderr by a background QueueListener thread, so request
+    handlers never block on the stream handler's lock or I/O.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root = logging.getLogger()
+    root.setLevel(level or os.getenv("LOG_LEVEL", "INFO").upper())
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    # Flush anything still queued on shutdown
+    atexit.register(_listener.stop)
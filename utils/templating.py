@@ -0,0 +1,42 @@
+import os
+import logging
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+
+from utils.flash import get_flashed_messages
+
+TEMPLATE_DIR = "templates"
+# Set TEMPLATES_AUTO_RELOAD=true in development to pick up template edits without a restart
+TEMPLATES_AUTO_RELOAD = os.getenv("TEMPLATES_AUTO_RELOAD", "false").lower() in ("1", "true", "yes")
+
+# One Environment for the whole app, so every router shares the same compiled-template cache
+templates = Jinja2Templates(directory=TEMPLATE_DIR)
+templates.env.auto_reload = TEMPLATES_AUTO_RELOAD
+# No directory given: Jinja uses a private per-user temp dir (mode 0700, ownership checked),
+# so other local users cannot plant bytecode for the app to load
+templates.env.bytecode_cache = FileSystemBytecodeCache()
+templates.env.globals["get_flashed_messages"] = get_flashed_messages
+
+# Rendered on nearly every request; compiled at startup so the first visitor skips the parse
+HOT_TEMPLATES = (
+    "login.html",
+    "student/dashboard.html",
+    "student/courses.html",
+    "student/topics.html",
+    "faculty/dashboard.html",
+    "faculty/courses.html",
+    "faculty/topics.html",
+)
+
+
+def preload_templates() -> int:
+    """Compiles HOT_TEMPLATES into the shared environment's cache; returns how many loaded."""
+    loaded = 0
+    for name in HOT_TEMPLATES:
+        try:
+            templates.get_template(name)
+            loaded += 1
+        except Exception as e:
+            logging.warning(f"Could not preload template {name}: {e}")
+    return loaded
@@ -1,8 +1,8 @@
-from datetime import datetime
-import pytz
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
 
 # Define the target time zone constant once
-PHILIPPINE_TIMEZONE = pytz.timezone('Asia/Manila')
+PHILIPPINE_TIMEZONE = ZoneInfo('Asia/Manila')
 
 def get_ph_time_from_utc(utc_datetime: datetime) -> datetime:
     """
@@ -14,7 +14,7 @@ def get_ph_time_from_utc(utc_datetime: datetime) -> datetime:
         
     # 1. Assume naive datetime objects from the database are UTC
     #    (This is true for datetime.utcnow() columns)
-    utc_aware_datetime = pytz.utc.localize(utc_datetime)
+    utc_aware_datetime = utc_datetime.replace(tzinfo=timezone.utc)
     
-    # 2. Convert (localize and astimezone) to the Philippine time zone
-    return utc_aware_datetime.astimezone(PHILIPPINE_TIMEZONE)
\ No newline at end of file
+    # 2. Convert to the Philippine time zone
+    return utc_aware_datetime.astimezone(PHILIPPINE_TIMEZONE)